@@ -78,6 +78,9 @@ class ProductionSettings:
     # External Services
     OLLAMA_BASE_URL: str = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
     CHROMA_PERSIST_DIRECTORY: str = os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_db")
+    CHROMA_MODE: str = os.getenv("CHROMA_MODE", "persistent")  # "persistent" or "http"
+    CHROMA_HOST: str = os.getenv("CHROMA_HOST", "localhost")
+    CHROMA_PORT: int = int(os.getenv("CHROMA_PORT", "8000"))
     
     # Performance Settings
     CACHE_TTL: int = int(os.getenv("CACHE_TTL", "300"))  # 5 minutes
@@ -6,6 +6,7 @@ Provides unified interface for interacting with various Ollama models
 import asyncio
 import json
 import logging
+import math
 from typing import Dict, List, Optional, Any, Union
 from datetime import datetime
 import httpx
@@ -14,6 +15,14 @@ from pydantic import BaseModel, Field
 logger = logging.getLogger(__name__)
 
 
+def normalize_embedding(embedding: List[float]) -> List[float]:
+    """Scale an embedding to unit L2 length, as Ollama's /api/embed returns it."""
+    norm = math.sqrt(sum(value * value for value in embedding))
+    if norm == 0:
+        return embedding
+    return [value / norm for value in embedding]
+
+
 class AIMessage(BaseModel):
     """AI message model."""
     role: str = Field(..., description="Message role: system, user, or assistant")
@@ -41,9 +50,14 @@ class AIRequest(BaseModel):
 class OllamaClient:
     """Client for interacting with Ollama models."""
     
+    # One-prompt embedding requests in flight when the caller passes no semaphore
+    EMBEDDING_CONCURRENCY = 8
+    
     def __init__(self, base_url: str = "http://localhost:11434"):
         self.base_url = base_url
         self.client = httpx.AsyncClient(timeout=30.0)
+        # Cleared once the server turns out to predate the batch /api/embed endpoint
+        self.batch_embeddings_supported = True
         self.available_models = {}
         self.model_configs = {
             "llama3:8b": {
@@ -224,27 +238,88 @@ class OllamaClient:
         model: str = "nomic-embed-text:latest"
     ) -> List[float]:
         """Generate embeddings for text."""
+        # Same endpoint as batches so single and bulk vectors are directly comparable;
+        # falls back to /api/embeddings on servers without /api/embed
+        embeddings = await self.generate_embeddings_batch([text], model)
+        return embeddings[0]
+    
+    async def generate_embeddings_batch(
+        self,
+        texts: List[str],
+        model: str = "nomic-embed-text:latest",
+        semaphore: Optional[asyncio.Semaphore] = None
+    ) -> List[List[float]]:
+        """Generate unit-length embeddings for several texts in a single request.
+        
+        When given, semaphore is held for each HTTP request, so callers embedding
+        many batches bound the requests in flight on either endpoint.
+        """
         try:
+            if not self.batch_embeddings_supported:
+                return await self._generate_embeddings_legacy(texts, model, semaphore)
+            
             request_data = {
                 "model": model,
-                "prompt": text
+                "input": texts
             }
             
-            response = await self.client.post(
-                f"{self.base_url}/api/embeddings",
-                json=request_data
-            )
+            response = await self._post_embedding_request("/api/embed", request_data, semaphore)
+            
+            if response.status_code == 404:
+                # Older Ollama servers only have the one-prompt /api/embeddings endpoint
+                # (a 404 can also mean an unknown model, which the fallback reports)
+                embeddings = await self._generate_embeddings_legacy(texts, model, semaphore)
+                self.batch_embeddings_supported = False
+                logger.info("Ollama server has no /api/embed; using /api/embeddings")
+                return embeddings
             
             if response.status_code != 200:
                 raise Exception(f"HTTP {response.status_code}: {response.text}")
             
-            response_data = response.json()
-            return response_data.get("embedding", [])
+            embeddings = response.json().get("embeddings", [])
+            if len(embeddings) != len(texts):
+                raise Exception(f"Expected {len(texts)} embeddings, got {len(embeddings)}")
+            return embeddings
             
         except Exception as e:
             logger.error(f"Error generating embeddings: {e}")
             raise
     
+    async def _post_embedding_request(
+        self,
+        path: str,
+        request_data: Dict[str, Any],
+        semaphore: Optional[asyncio.Semaphore]
+    ) -> httpx.Response:
+        """POST an embedding request, holding semaphore while it is in flight."""
+        if semaphore is None:
+            return await self.client.post(f"{self.base_url}{path}", json=request_data)
+        async with semaphore:
+            return await self.client.post(f"{self.base_url}{path}", json=request_data)
+    
+    async def _generate_embeddings_legacy(
+        self,
+        texts: List[str],
+        model: str,
+        semaphore: Optional[asyncio.Semaphore] = None
+    ) -> List[List[float]]:
+        """Generate embeddings one prompt per request through /api/embeddings."""
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.EMBEDDING_CONCURRENCY)
+        
+        async def embed(text: str) -> List[float]:
+            response = await self._post_embedding_request(
+                "/api/embeddings", {"model": model, "prompt": text}, semaphore
+            )
+            
+            if response.status_code != 200:
+                raise Exception(f"HTTP {response.status_code}: {response.text}")
+            
+            # /api/embeddings is unnormalised; match the unit vectors /api/embed returns
+            return normalize_embedding(response.json().get("embedding", []))
+        
+        return list(await asyncio.gather(*[embed(text) for text in texts]))
+    
     async def pull_model(self, model_name: str) -> Dict[str, Any]:
         """Pull/download a model."""
         try:
@@ -4,14 +4,21 @@ Provides comprehensive caching capabilities for the application
 """
 
 import json
+import pickle
+import dataclasses
 import hashlib
 import asyncio
 from typing import Any, Optional, Dict, List, Union
 from functools import wraps
+from decimal import Decimal
+from enum import Enum
+from uuid import UUID
 import redis.asyncio as redis
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import logging
 
+from pydantic import BaseModel
+
 logger = logging.getLogger(__name__)
 
 
@@ -99,16 +106,29 @@ class RedisCache:
         return f"{prefix}{identifier}"
     
     def _serialize_data(self, data: Any) -> str:
-        """Serialize data for caching"""
+        """Serialize data for caching, tagging the payload with a one-character type code"""
+        data_type = type(data)
+        if data_type is str:
+            return "S" + data
+        if data_type is int:
+            return "I" + str(data)
         try:
-            return json.dumps(data, default=str)
+            return "J" + json.dumps(data, default=str)
         except Exception as e:
             logger.error(f"Failed to serialize data: {e}")
-            return json.dumps({"error": "serialization_failed"})
+            return "J" + json.dumps({"error": "serialization_failed"})
     
     def _deserialize_data(self, data: str) -> Any:
         """Deserialize cached data"""
         try:
+            tag = data[:1]
+            if tag == "S":
+                return data[1:]
+            if tag == "I":
+                return int(data[1:])
+            if tag == "J":
+                return json.loads(data[1:])
+            # Untagged entries written before type tagging was introduced
             return json.loads(data)
         except Exception as e:
             logger.error(f"Failed to deserialize data: {e}")
@@ -193,7 +213,15 @@ class RedisCache:
             return {"error": "Redis not connected"}
         
         try:
-            info = await self.redis_client.info()
+            # Fetch only the INFO sections we report on, plus DBSIZE, in one round trip
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.info("stats")
+                pipe.info("memory")
+                pipe.info("clients")
+                pipe.dbsize()
+                stats, memory, clients, db_size = await pipe.execute()
+
+            info = {**stats, **memory, **clients}
             return {
                 "connected_clients": info.get("connected_clients", 0),
                 "used_memory": info.get("used_memory_human", "0B"),
@@ -201,7 +229,7 @@ class RedisCache:
                 "keyspace_hits": info.get("keyspace_hits", 0),
                 "keyspace_misses": info.get("keyspace_misses", 0),
                 "hit_rate": self._calculate_hit_rate(info),
-                "db_size": await self.redis_client.dbsize()
+                "db_size": db_size
             }
         except Exception as e:
             logger.error(f"Cache stats error: {e}")
@@ -271,6 +299,60 @@ class CacheManager:
 cache_manager = CacheManager()
 
 
+# Scalars whose pickle depends only on their value, identically in every process
+_KEY_SCALAR_TYPES = (str, bytes, int, float, bool, type(None), datetime, date, Decimal, UUID, Enum)
+
+
+def _frame(part: bytes) -> bytes:
+    """Length-prefix one encoded part so adjacent parts can't run together"""
+    return len(part).to_bytes(8, "little") + part
+
+
+def _encode_key_value(value: Any) -> bytes:
+    """Canonical bytes for a cache-key argument
+    
+    Keys are shared through Redis, so the encoding may depend only on the value:
+    never on id() (reused once an object dies) or on salted hash() (differs per
+    worker under PYTHONHASHSEED), which is also why sets and dicts are sorted.
+    """
+    if isinstance(value, _KEY_SCALAR_TYPES):
+        return pickle.dumps(value, protocol=5)
+    if isinstance(value, (list, tuple)):
+        tag = b"L" if isinstance(value, list) else b"T"
+        parts = [_frame(_encode_key_value(item)) for item in value]
+    elif isinstance(value, dict):
+        tag = b"D"
+        parts = sorted(_frame(_encode_key_value(key)) + _frame(_encode_key_value(item))
+                       for key, item in value.items())
+    elif isinstance(value, (set, frozenset)):
+        tag = b"S"
+        parts = sorted(_frame(_encode_key_value(item)) for item in value)
+    elif isinstance(value, BaseModel):
+        tag = b"M"
+        parts = [_frame(type(value).__qualname__.encode()), _frame(_encode_key_value(value.model_dump()))]
+    elif dataclasses.is_dataclass(value) and not isinstance(value, type):
+        tag = b"C"
+        field_values = tuple(getattr(value, field.name) for field in dataclasses.fields(value))
+        parts = [_frame(type(value).__qualname__.encode()), _frame(_encode_key_value(field_values))]
+    else:
+        raise TypeError(
+            f"Cannot build a cache key from {type(value).__qualname__}; pass key_func to cache_result"
+        )
+    return tag + len(parts).to_bytes(8, "little") + b"".join(parts)
+
+
+def _default_cache_key(func, args: tuple, kwargs: Dict[str, Any]) -> str:
+    """Hash call arguments into a 128-bit cache key that is stable across processes"""
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(_frame(f"{func.__module__}.{func.__qualname__}".encode()))
+    for arg in args:
+        hasher.update(_frame(_encode_key_value(arg)))
+    for name in sorted(kwargs):
+        hasher.update(_frame(name.encode()))
+        hasher.update(_frame(_encode_key_value(kwargs[name])))
+    return hasher.hexdigest()
+
+
 def cache_result(cache_type: str, ttl: Optional[int] = None, key_func: Optional[callable] = None):
     """
     Decorator for caching function results
@@ -278,7 +360,9 @@ def cache_result(cache_type: str, ttl: Optional[int] = None, key_func: Optional[
     Args:
         cache_type: Type of cache (projects, features, etc.)
         ttl: Time to live in seconds
-        key_func: Function to generate cache key from function arguments
+        key_func: Function to generate cache key from function arguments; required
+            when an argument is not a scalar, container, Pydantic model or dataclass
+            (methods included, since self is an argument)
     """
     def decorator(func):
         @wraps(func)
@@ -288,8 +372,7 @@ def cache_result(cache_type: str, ttl: Optional[int] = None, key_func: Optional[
                 cache_key = key_func(*args, **kwargs)
             else:
                 # Default key generation
-                key_data = str(args) + str(sorted(kwargs.items()))
-                cache_key = hashlib.md5(key_data.encode()).hexdigest()
+                cache_key = _default_cache_key(func, args, kwargs)
             
             # Try to get from cache
             cached_result = await cache_manager.cache.get(cache_type, cache_key)
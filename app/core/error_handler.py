@@ -2,59 +2,130 @@
 Enhanced Error Handling for GenAI Metrics Dashboard
 Implements comprehensive error handling, logging, and monitoring
 """
+import array
+import os
+import re
+import threading
+import time
 import traceback
-import uuid
-from typing import Dict, Any, Optional
+from collections import Counter
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Optional, Tuple
 from datetime import datetime
 from fastapi import Request, HTTPException, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 import logging
 import json
 
 logger = logging.getLogger(__name__)
 
+def _new_request_id() -> str:
+    """Generate an opaque correlation ID for the X-Request-ID header"""
+    return os.urandom(16).hex()
+
+# (epoch second, ISO timestamp) for the most recently formatted second
+_TS_CACHE: Tuple[int, str] = (0, "")
+
+def _now_iso() -> str:
+    """Return the ISO timestamp for the current UTC second, formatting at most once per second"""
+    global _TS_CACHE
+    now = int(time.time())
+    cached = _TS_CACHE
+    if cached[0] != now:
+        cached = (now, datetime.utcfromtimestamp(now).isoformat())
+        _TS_CACHE = cached
+    return cached[1]
+
+class _KeywordClassifier:
+    """Single-pass matcher mapping error messages to (error code, status code) via prioritized keyword rules"""
+    
+    def __init__(self, rules: Tuple[Tuple[str, str, int], ...], default: Tuple[str, int]):
+        self._rules = {keyword: (priority, error_code, status_code)
+                       for priority, (keyword, error_code, status_code) in enumerate(rules)}
+        # Zero-width lookahead reports a keyword at every offset, so overlapping keywords are all seen
+        alternatives = "|".join(re.escape(keyword) for keyword, _, _ in rules)
+        self._pattern = re.compile(f"(?=({alternatives}))")
+        self._default = default
+    
+    def classify(self, error_message: str) -> Tuple[str, int]:
+        """Return the code and status of the highest-priority keyword found in the message"""
+        best = None
+        for match in self._pattern.finditer(error_message.lower()):
+            rule = self._rules[match.group(1)]
+            if best is None or rule[0] < best[0]:
+                best = rule
+                if best[0] == 0:
+                    break
+        return (best[1], best[2]) if best else self._default
+
+_DB_ERROR_CLASSIFIER = _KeywordClassifier(
+    (
+        ("not found", "DB_003", status.HTTP_404_NOT_FOUND),
+        ("constraint", "DB_004", status.HTTP_409_CONFLICT),
+        ("connection", "DB_001", status.HTTP_503_SERVICE_UNAVAILABLE),
+    ),
+    default=("DB_002", status.HTTP_500_INTERNAL_SERVER_ERROR)
+)
+
+_EXT_ERROR_CLASSIFIER = _KeywordClassifier(
+    (
+        ("timeout", "EXT_002", status.HTTP_504_GATEWAY_TIMEOUT),
+        ("connection", "EXT_001", status.HTTP_503_SERVICE_UNAVAILABLE),
+    ),
+    default=("EXT_003", status.HTTP_502_BAD_GATEWAY)
+)
+
+# Catalogue of error codes and their default messages (read-only)
+_ERROR_CODES: Mapping[str, str] = MappingProxyType({
+    # Authentication & Authorization
+    "AUTH_001": "Invalid credentials",
+    "AUTH_002": "Token expired",
+    "AUTH_003": "Insufficient permissions",
+    "AUTH_004": "Account locked",
+    
+    # Validation Errors
+    "VAL_001": "Invalid input data",
+    "VAL_002": "Missing required field",
+    "VAL_003": "Invalid format",
+    "VAL_004": "Value out of range",
+    
+    # Database Errors
+    "DB_001": "Database connection failed",
+    "DB_002": "Query execution failed",
+    "DB_003": "Data not found",
+    "DB_004": "Constraint violation",
+    
+    # External Service Errors
+    "EXT_001": "External service unavailable",
+    "EXT_002": "External service timeout",
+    "EXT_003": "External service error",
+    
+    # Rate Limiting
+    "RATE_001": "Rate limit exceeded",
+    "RATE_002": "Too many requests",
+    
+    # Security Errors
+    "SEC_001": "CSRF token invalid",
+    "SEC_002": "Security violation detected",
+    "SEC_003": "Suspicious activity",
+    
+    # System Errors
+    "SYS_001": "Internal server error",
+    "SYS_002": "Service unavailable",
+    "SYS_003": "Configuration error",
+})
+
+# Static portion of each catalogued error body, built once
+_ERROR_TEMPLATES: Mapping[str, Dict[str, str]] = MappingProxyType({
+    code: {"code": code, "message": default_message}
+    for code, default_message in _ERROR_CODES.items()
+})
+
 class ErrorHandler:
     """Enhanced error handling with detailed logging and monitoring"""
     
     def __init__(self):
-        self.error_codes = {
-            # Authentication & Authorization
-            "AUTH_001": "Invalid credentials",
-            "AUTH_002": "Token expired",
-            "AUTH_003": "Insufficient permissions",
-            "AUTH_004": "Account locked",
-            
-            # Validation Errors
-            "VAL_001": "Invalid input data",
-            "VAL_002": "Missing required field",
-            "VAL_003": "Invalid format",
-            "VAL_004": "Value out of range",
-            
-            # Database Errors
-            "DB_001": "Database connection failed",
-            "DB_002": "Query execution failed",
-            "DB_003": "Data not found",
-            "DB_004": "Constraint violation",
-            
-            # External Service Errors
-            "EXT_001": "External service unavailable",
-            "EXT_002": "External service timeout",
-            "EXT_003": "External service error",
-            
-            # Rate Limiting
-            "RATE_001": "Rate limit exceeded",
-            "RATE_002": "Too many requests",
-            
-            # Security Errors
-            "SEC_001": "CSRF token invalid",
-            "SEC_002": "Security violation detected",
-            "SEC_003": "Suspicious activity",
-            
-            # System Errors
-            "SYS_001": "Internal server error",
-            "SYS_002": "Service unavailable",
-            "SYS_003": "Configuration error",
-        }
+        self.error_codes = _ERROR_CODES
     
     def create_error_response(
         self,
@@ -63,29 +134,26 @@ class ErrorHandler:
         details: Dict[str, Any] = None,
         status_code: int = 500,
         request_id: str = None
-    ) -> JSONResponse:
+    ) -> ORJSONResponse:
         """Create standardized error response"""
         
         if not request_id:
-            request_id = str(uuid.uuid4())
+            request_id = _new_request_id()
         
-        error_info = {
-            "error": {
-                "code": error_code,
-                "message": message or self.error_codes.get(error_code, "Unknown error"),
-                "details": details or {},
-                "request_id": request_id,
-                "timestamp": datetime.utcnow().isoformat(),
-                "status_code": status_code
-            }
-        }
+        error_body = dict(_ERROR_TEMPLATES.get(error_code) or {"code": error_code, "message": "Unknown error"})
+        if message:
+            error_body["message"] = message
+        error_body["details"] = details or {}
+        error_body["request_id"] = request_id
+        error_body["timestamp"] = _now_iso()
+        error_body["status_code"] = status_code
         
         # Log the error
         self.log_error(error_code, message, details, request_id, status_code)
         
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=status_code,
-            content=error_info,
+            content={"error": error_body},
             headers={"X-Request-ID": request_id}
         )
     
@@ -105,7 +173,7 @@ class ErrorHandler:
             "details": details,
             "request_id": request_id,
             "status_code": status_code,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": _now_iso()
         }
         
         if status_code >= 500:
@@ -115,7 +183,7 @@ class ErrorHandler:
         else:
             logger.info(f"Error [{error_code}]: {message}", extra=log_data)
     
-    def handle_validation_error(self, error: Exception, request_id: str = None) -> JSONResponse:
+    def handle_validation_error(self, error: Exception, request_id: str = None) -> ORJSONResponse:
         """Handle validation errors"""
         return self.create_error_response(
             error_code="VAL_001",
@@ -125,22 +193,10 @@ class ErrorHandler:
             request_id=request_id
         )
     
-    def handle_database_error(self, error: Exception, request_id: str = None) -> JSONResponse:
+    def handle_database_error(self, error: Exception, request_id: str = None) -> ORJSONResponse:
         """Handle database errors"""
         error_message = str(error)
-        
-        if "not found" in error_message.lower():
-            error_code = "DB_003"
-            status_code = status.HTTP_404_NOT_FOUND
-        elif "constraint" in error_message.lower():
-            error_code = "DB_004"
-            status_code = status.HTTP_409_CONFLICT
-        elif "connection" in error_message.lower():
-            error_code = "DB_001"
-            status_code = status.HTTP_503_SERVICE_UNAVAILABLE
-        else:
-            error_code = "DB_002"
-            status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+        error_code, status_code = _DB_ERROR_CLASSIFIER.classify(error_message)
         
         return self.create_error_response(
             error_code=error_code,
@@ -150,19 +206,10 @@ class ErrorHandler:
             request_id=request_id
         )
     
-    def handle_external_service_error(self, error: Exception, service_name: str, request_id: str = None) -> JSONResponse:
+    def handle_external_service_error(self, error: Exception, service_name: str, request_id: str = None) -> ORJSONResponse:
         """Handle external service errors"""
         error_message = str(error)
-        
-        if "timeout" in error_message.lower():
-            error_code = "EXT_002"
-            status_code = status.HTTP_504_GATEWAY_TIMEOUT
-        elif "connection" in error_message.lower():
-            error_code = "EXT_001"
-            status_code = status.HTTP_503_SERVICE_UNAVAILABLE
-        else:
-            error_code = "EXT_003"
-            status_code = status.HTTP_502_BAD_GATEWAY
+        error_code, status_code = _EXT_ERROR_CLASSIFIER.classify(error_message)
         
         return self.create_error_response(
             error_code=error_code,
@@ -172,7 +219,7 @@ class ErrorHandler:
             request_id=request_id
         )
     
-    def handle_rate_limit_error(self, limit_info: Dict[str, Any], request_id: str = None) -> JSONResponse:
+    def handle_rate_limit_error(self, limit_info: Dict[str, Any], request_id: str = None) -> ORJSONResponse:
         """Handle rate limiting errors"""
         return self.create_error_response(
             error_code="RATE_001",
@@ -182,7 +229,7 @@ class ErrorHandler:
             request_id=request_id
         )
     
-    def handle_security_error(self, error_type: str, details: Dict[str, Any], request_id: str = None) -> JSONResponse:
+    def handle_security_error(self, error_type: str, details: Dict[str, Any], request_id: str = None) -> ORJSONResponse:
         """Handle security-related errors"""
         error_codes = {
             "csrf": "SEC_001",
@@ -200,7 +247,7 @@ class ErrorHandler:
             request_id=request_id
         )
     
-    def handle_unexpected_error(self, error: Exception, request_id: str = None) -> JSONResponse:
+    def handle_unexpected_error(self, error: Exception, request_id: str = None) -> ORJSONResponse:
         """Handle unexpected errors"""
         # Log full traceback for debugging
         logger.error(f"Unexpected error: {str(error)}", extra={
@@ -223,7 +270,7 @@ error_handler = ErrorHandler()
 # Enhanced exception handlers
 async def enhanced_404_handler(request: Request, exc):
     """Enhanced 404 error handler"""
-    request_id = str(uuid.uuid4())
+    request_id = _new_request_id()
     return error_handler.create_error_response(
         error_code="SYS_001",
         message="Resource not found",
@@ -234,43 +281,60 @@ async def enhanced_404_handler(request: Request, exc):
 
 async def enhanced_500_handler(request: Request, exc):
     """Enhanced 500 error handler"""
-    request_id = str(uuid.uuid4())
+    request_id = _new_request_id()
     return error_handler.handle_unexpected_error(exc, request_id)
 
 async def enhanced_validation_handler(request: Request, exc):
     """Enhanced validation error handler"""
-    request_id = str(uuid.uuid4())
+    request_id = _new_request_id()
     return error_handler.handle_validation_error(exc, request_id)
 
 # Error monitoring and alerting
 class ErrorMonitor:
     """Monitor errors and send alerts for critical issues"""
     
+    # Number of per-minute buckets retained in the ring buffer
+    WINDOW_MINUTES = 60
+    
     def __init__(self):
-        self.error_counts = {}
+        self._ring = [Counter() for _ in range(self.WINDOW_MINUTES)]
+        self._ring_minute = [0] * self.WINDOW_MINUTES
+        self._lock = threading.Lock()
         self.alert_thresholds = {
             "SYS_001": 10,  # System errors
             "DB_001": 5,    # Database connection errors
             "EXT_001": 5,   # External service errors
         }
+        
+        # Fixed-layout per-minute counters for the monitored codes, reset lazily on minute change
+        self._code_index = {code: index for index, code in enumerate(self.alert_thresholds)}
+        self._thresholds = array.array("q", self.alert_thresholds.values())
+        self._counts = array.array("q", bytes(8 * len(self._thresholds)))
+        self._counts_minute = 0
     
     def track_error(self, error_code: str, request_id: str):
         """Track error occurrence"""
-        current_time = datetime.utcnow()
-        minute_key = current_time.strftime("%Y-%m-%d %H:%M")
+        minute = int(time.time()) // 60
+        slot = minute % self.WINDOW_MINUTES
+        index = self._code_index.get(error_code)
         
-        if minute_key not in self.error_counts:
-            self.error_counts[minute_key] = {}
-        
-        if error_code not in self.error_counts[minute_key]:
-            self.error_counts[minute_key][error_code] = 0
-        
-        self.error_counts[minute_key][error_code] += 1
+        with self._lock:
+            if self._ring_minute[slot] != minute:
+                self._ring[slot].clear()
+                self._ring_minute[slot] = minute
+            self._ring[slot][error_code] += 1
+            
+            if index is None:
+                return
+            if self._counts_minute != minute:
+                self._counts = array.array("q", bytes(8 * len(self._thresholds)))
+                self._counts_minute = minute
+            count = self._counts[index] + 1
+            self._counts[index] = count
         
         # Check if threshold exceeded
-        threshold = self.alert_thresholds.get(error_code, 0)
-        if self.error_counts[minute_key][error_code] >= threshold:
-            self.send_alert(error_code, self.error_counts[minute_key][error_code], request_id)
+        if count >= self._thresholds[index]:
+            self.send_alert(error_code, count, request_id)
     
     def send_alert(self, error_code: str, count: int, request_id: str):
         """Send alert for critical error threshold exceeded"""
@@ -282,13 +346,22 @@ class ErrorMonitor:
         })
     
     def get_error_stats(self) -> Dict[str, Any]:
-        """Get error statistics"""
-        current_time = datetime.utcnow()
-        minute_key = current_time.strftime("%Y-%m-%d %H:%M")
+        """Get error statistics for the current minute and the retained window"""
+        minute = int(time.time()) // 60
+        oldest = minute - self.WINDOW_MINUTES
+        
+        with self._lock:
+            slot = minute % self.WINDOW_MINUTES
+            current_minute = dict(self._ring[slot]) if self._ring_minute[slot] == minute else {}
+            total_errors = sum(
+                sum(counts.values())
+                for counts, bucket_minute in zip(self._ring, self._ring_minute)
+                if bucket_minute > oldest
+            )
         
         return {
-            "current_minute": self.error_counts.get(minute_key, {}),
-            "total_errors": sum(sum(minute_errors.values()) for minute_errors in self.error_counts.values()),
+            "current_minute": current_minute,
+            "total_errors": total_errors,
             "thresholds": self.alert_thresholds
         }
 
@@ -306,7 +379,7 @@ def handle_errors(error_code: str = "SYS_001", status_code: int = 500):
                 # Re-raise HTTP exceptions
                 raise
             except Exception as e:
-                request_id = str(uuid.uuid4())
+                request_id = _new_request_id()
                 error_monitor.track_error(error_code, request_id)
                 return error_handler.handle_unexpected_error(e, request_id)
         return wrapper
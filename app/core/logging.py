@@ -4,46 +4,176 @@ Provides detailed logging for all modules and functions with easy error tracking
 """
 
 import logging
+import logging.handlers
 import os
 import json
-import traceback
+import queue
+import threading
+import atexit
+import time
+import weakref
 from datetime import datetime
 from typing import Any, Dict, Optional, Union
-from functools import wraps
+from functools import wraps, lru_cache
 import inspect
 import sys
 
+import orjson
+
+# Create logs directory once at import rather than per logger
+os.makedirs("logs", exist_ok=True)
+
+def _dumps(data: Any, option: int = 0) -> bytes:
+    """Serialize a log payload with orjson, tolerating non-JSON values like json.dumps(default=str)"""
+    return orjson.dumps(data, default=str, option=option | orjson.OPT_NON_STR_KEYS)
+
+class _PayloadFormatter(logging.Formatter):
+    """Formatter that serializes a record's structured `payload` extra only when the record is emitted"""
+    
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        payload = record.__dict__.get("payload")
+        if payload is not None:
+            # Cache on the record so file and console handlers share one serialization
+            payload_json = record.__dict__.get("payload_json")
+            if payload_json is None:
+                payload_json = record.payload_json = _dumps(payload).decode()
+            record.message = f"{record.message} | {payload_json}"
+        return super().formatMessage(record)
+
+# Log file rotation and buffering settings
+_LOG_MAX_BYTES = 50_000_000
+_LOG_BACKUP_COUNT = 5
+_LOG_BUFFER_SIZE = 64 * 1024
+_LOG_FLUSH_INTERVAL = 0.1  # seconds
+
+class _BufferedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Size-rotated file handler that buffers writes and leaves flushing to a background thread"""
+    
+    def __init__(self, filename: str, maxBytes: int = _LOG_MAX_BYTES, backupCount: int = _LOG_BACKUP_COUNT):
+        super().__init__(filename, maxBytes=maxBytes, backupCount=backupCount, delay=True)
+        # The stream opens lazily, so start from the existing file's size for the first rollover check
+        try:
+            self._size = os.path.getsize(self.baseFilename)
+        except OSError:
+            self._size = 0
+        _register_buffered_handler(self)
+    
+    def _open(self):
+        stream = open(self.baseFilename, self.mode, buffering=_LOG_BUFFER_SIZE,
+                      encoding=self.encoding, errors=self.errors)
+        self._size = os.fstat(stream.fileno()).st_size
+        return stream
+    
+    def emit(self, record: logging.LogRecord):
+        # Track the file size ourselves: the base shouldRollover seeks (and so flushes) on every record
+        try:
+            msg = self.format(record) + self.terminator
+            # maxBytes counts bytes; emoji and other non-ASCII text is several bytes per character
+            size = len(msg) if msg.isascii() else len(msg.encode(self.encoding or "utf-8", self.errors or "strict"))
+            if self.maxBytes > 0 and self._size and self._size + size >= self.maxBytes:
+                self.doRollover()
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(msg)
+            self._size += size
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+_buffered_handlers: "weakref.WeakSet[_BufferedRotatingFileHandler]" = weakref.WeakSet()
+_flusher_thread: Optional[threading.Thread] = None
+_flusher_lock = threading.Lock()
+
+def _flush_buffered_handlers():
+    """Periodically flush every buffered file handler"""
+    while True:
+        time.sleep(_LOG_FLUSH_INTERVAL)
+        for handler in list(_buffered_handlers):
+            handler.flush()
+
+def _register_buffered_handler(handler: _BufferedRotatingFileHandler):
+    """Track a buffered handler and make sure the flusher thread is running"""
+    global _flusher_thread
+    _buffered_handlers.add(handler)
+    if _flusher_thread is None:
+        with _flusher_lock:
+            if _flusher_thread is None:
+                _flusher_thread = threading.Thread(target=_flush_buffered_handlers,
+                                                   name="log-flusher", daemon=True)
+                _flusher_thread.start()
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that enqueues records untouched so formatting happens on the listener thread"""
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+class _ErrorFileFormatter(logging.Formatter):
+    """Render queued error records as single-line JSON entries of errors.log"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        # Reuse the JSON already encoded by log_error and splice the traceback in as a last field
+        payload_json = record.__dict__.get("payload_json")
+        if payload_json is None:
+            payload_json = _dumps(record.payload).decode()
+        if record.exc_info:
+            traceback_json = _dumps(self.formatException(record.exc_info)).decode()
+            payload_json = f'{payload_json[:-1]},"traceback":{traceback_json}}}'
+        return payload_json
+
+# Error-file records are queued by the caller and written by a background listener thread
+_error_file_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+_error_file_logger = logging.getLogger(f"{__name__}.error_file")
+_error_file_logger.propagate = False
+_error_file_logger.setLevel(logging.ERROR)
+_error_file_logger.addHandler(_DeferredQueueHandler(_error_file_queue))
+_error_file_listener: Optional[logging.handlers.QueueListener] = None
+_error_file_lock = threading.Lock()
+
+def _get_error_file_logger() -> logging.Logger:
+    """Return the queued error-file logger, starting its listener on first use"""
+    global _error_file_listener
+    if _error_file_listener is None:
+        with _error_file_lock:
+            if _error_file_listener is None:
+                file_handler = _BufferedRotatingFileHandler("logs/errors.log")
+                file_handler.setFormatter(_ErrorFileFormatter())
+                listener = logging.handlers.QueueListener(_error_file_queue, file_handler)
+                listener.start()
+                atexit.register(listener.stop)
+                _error_file_listener = listener
+    return _error_file_logger
+
+# One formatter and one console handler shared by every DetailedLogger via a dedicated parent
+# logger. It is separate from "app" so plain logging.getLogger("app.*") loggers keep reaching root.
+_DETAILED_LOGGER_NAME = "detailed"
+_detailed_formatter = _PayloadFormatter(
+    '%(asctime)s | %(levelname)-8s | %(name)s | %(funcName)s:%(lineno)d | %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+_console_handler = logging.StreamHandler()
+_console_handler.setLevel(logging.INFO)
+_console_handler.setFormatter(_detailed_formatter)
+_detailed_logger = logging.getLogger(_DETAILED_LOGGER_NAME)
+_detailed_logger.addHandler(_console_handler)
+# The shared console handler replaces the root handler for DetailedLoggers, so records print once
+_detailed_logger.propagate = False
+
 class DetailedLogger:
     """Enhanced logger with module and function-specific logging"""
     
     def __init__(self, name: str, log_level: str = "INFO"):
-        self.logger = logging.getLogger(name)
+        # Nest every module logger under "detailed" so they inherit the shared console handler
+        self.logger = logging.getLogger(f"{_DETAILED_LOGGER_NAME}.{name}")
         self.logger.setLevel(getattr(logging, log_level.upper()))
         
-        # Create logs directory if it doesn't exist
-        os.makedirs("logs", exist_ok=True)
-        
-        # Configure file handler for detailed logs
-        file_handler = logging.FileHandler(f"logs/{name.lower().replace('.', '_')}.log")
-        file_handler.setLevel(logging.DEBUG)
-        
-        # Configure console handler
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(logging.INFO)
-        
-        # Create formatter
-        detailed_formatter = logging.Formatter(
-            '%(asctime)s | %(levelname)-8s | %(name)s | %(funcName)s:%(lineno)d | %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
-        
-        file_handler.setFormatter(detailed_formatter)
-        console_handler.setFormatter(detailed_formatter)
-        
-        # Add handlers if not already added
+        # Only the per-module file handler is unique to this logger
         if not self.logger.handlers:
+            file_handler = _BufferedRotatingFileHandler(f"logs/{name.lower().replace('.', '_')}.log")
+            file_handler.setLevel(logging.DEBUG)
+            file_handler.setFormatter(_detailed_formatter)
             self.logger.addHandler(file_handler)
-            self.logger.addHandler(console_handler)
     
     # Passthrough standard logging methods for compatibility
     def debug(self, msg: str, *args, **kwargs):
@@ -63,11 +193,15 @@ class DetailedLogger:
     
     def log_function_entry(self, func_name: str, args: tuple = (), kwargs: dict = None):
         """Log function entry with parameters"""
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
         kwargs = kwargs or {}
         self.logger.debug(f"ENTER {func_name} | args={args} | kwargs={kwargs}")
     
     def log_function_exit(self, func_name: str, result: Any = None, execution_time: float = None):
         """Log function exit with result and execution time"""
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
         time_info = f" | execution_time={execution_time:.4f}s" if execution_time else ""
         result_info = f" | result={str(result)[:200]}..." if result and len(str(result)) > 200 else f" | result={result}"
         self.logger.debug(f"EXIT {func_name}{time_info}{result_info}")
@@ -75,19 +209,23 @@ class DetailedLogger:
     def log_error(self, func_name: str, error: Exception, context: Dict = None):
         """Log detailed error information"""
         context = context or {}
+        # The traceback is rendered by the handlers that actually emit the record
+        exc_info = (type(error), error, error.__traceback__)
         error_info = {
             "function": func_name,
             "error_type": type(error).__name__,
             "error_message": str(error),
-            "traceback": traceback.format_exc(),
             "context": context,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": datetime.now()
         }
         
-        self.logger.error(f"ERROR in {func_name} | {json.dumps(error_info, indent=2)}")
+        # Encode once; both the module log and errors.log reuse these bytes
+        payload_json = _dumps(error_info).decode()
+        self.logger.error(f"ERROR in {func_name}", exc_info=exc_info,
+                          extra={"payload": error_info, "payload_json": payload_json})
         
         # Also log to error-specific file
-        self._log_to_error_file(error_info)
+        self._log_to_error_file(error_info, exc_info, payload_json)
     
     def log_api_call(self, method: str, endpoint: str, status_code: int, response_time: float, 
                     request_data: Any = None, response_data: Any = None):
@@ -99,11 +237,11 @@ class DetailedLogger:
             "response_time": response_time,
             "request_data": str(request_data)[:500] if request_data else None,
             "response_data": str(response_data)[:500] if response_data else None,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": datetime.now()
         }
         
         level = logging.INFO if 200 <= status_code < 400 else logging.WARNING
-        self.logger.log(level, f"API_CALL | {json.dumps(api_info)}")
+        self.logger.log(level, "API_CALL", extra={"payload": api_info})
     
     def log_database_query(self, query: str, params: Dict = None, execution_time: float = None, 
                           row_count: int = None):
@@ -113,10 +251,10 @@ class DetailedLogger:
             "params": params,
             "execution_time": execution_time,
             "row_count": row_count,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": datetime.now()
         }
         
-        self.logger.debug(f"DB_QUERY | {json.dumps(query_info)}")
+        self.logger.debug("DB_QUERY", extra={"payload": query_info})
     
     def log_frontend_event(self, event_type: str, component: str, data: Dict = None):
         """Log frontend events"""
@@ -124,43 +262,50 @@ class DetailedLogger:
             "event_type": event_type,
             "component": component,
             "data": data,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": datetime.now()
         }
         
-        self.logger.info(f"FRONTEND_EVENT | {json.dumps(event_info)}")
+        self.logger.info("FRONTEND_EVENT", extra={"payload": event_info})
     
-    def _log_to_error_file(self, error_info: Dict):
+    def _log_to_error_file(self, error_info: Dict, exc_info: tuple = None, payload_json: str = None):
         """Log errors to a separate error file for easy analysis"""
-        error_file = "logs/errors.log"
-        with open(error_file, "a") as f:
-            f.write(f"\n{'='*80}\n")
-            f.write(json.dumps(error_info, indent=2))
-            f.write(f"\n{'='*80}\n")
+        # Traceback formatting happens in _ErrorFileFormatter on the listener thread
+        _get_error_file_logger().error("", exc_info=exc_info,
+                                       extra={"payload": error_info, "payload_json": payload_json})
 
 def log_function_calls(logger_name: str = None):
     """Decorator to automatically log function calls"""
     def decorator(func):
+        # Resolve the logger once per decorated function, falling back to its module name
+        logger = _get_logger(logger_name or inspect.getmodule(func).__name__)
+        
+        if not logger.logger.isEnabledFor(logging.DEBUG):
+            # Entry/exit logging is off (checked at decoration time): only report failures
+            @wraps(func)
+            def error_only_wrapper(*args, **kwargs):
+                try:
+                    return func(*args, **kwargs)
+                except Exception as e:
+                    logger.log_error(func.__name__, e, {
+                        "args": str(args)[:200],
+                        "kwargs": str(kwargs)[:200]
+                    })
+                    raise
+            return error_only_wrapper
+        
         @wraps(func)
         def wrapper(*args, **kwargs):
-            # Get logger
-            if logger_name:
-                logger = DetailedLogger(logger_name)
-            else:
-                # Try to get logger from module name
-                module_name = inspect.getmodule(func).__name__
-                logger = DetailedLogger(module_name)
-            
             # Log function entry
             logger.log_function_entry(func.__name__, args, kwargs)
             
-            start_time = datetime.now()
+            start_time = time.perf_counter()
             try:
                 result = func(*args, **kwargs)
-                execution_time = (datetime.now() - start_time).total_seconds()
+                execution_time = time.perf_counter() - start_time
                 logger.log_function_exit(func.__name__, result, execution_time)
                 return result
             except Exception as e:
-                execution_time = (datetime.now() - start_time).total_seconds()
+                execution_time = time.perf_counter() - start_time
                 logger.log_error(func.__name__, e, {
                     "args": str(args)[:200],
                     "kwargs": str(kwargs)[:200],
@@ -184,9 +329,14 @@ def log_api_endpoint(logger_name: str = None):
     return decorator
 
 # Create module-specific loggers
+@lru_cache(maxsize=None)
+def _get_logger(name: str) -> DetailedLogger:
+    """Build each DetailedLogger once and share it between callers"""
+    return DetailedLogger(name)
+
 def get_logger(module_name: str) -> DetailedLogger:
     """Get a logger for a specific module"""
-    return DetailedLogger(module_name)
+    return _get_logger(module_name)
 
 # Global loggers for different components
 api_logger = get_logger("api")
@@ -212,21 +362,28 @@ def analyze_logs(log_file: str = None, error_only: bool = False) -> Dict:
     }
     
     if os.path.isfile(log_file):
-        with open(log_file, "r") as f:
+        with open(log_file, "rb") as f:
             for line in f:
-                if "ERROR" in line:
-                    analysis["total_errors"] += 1
-                    # Parse error details
-                    try:
-                        error_data = json.loads(line.split("ERROR in ")[1].split(" | ")[1])
-                        error_type = error_data.get("error_type", "Unknown")
-                        function = error_data.get("function", "Unknown")
-                        
-                        analysis["error_types"][error_type] = analysis["error_types"].get(error_type, 0) + 1
-                        analysis["function_errors"][function] = analysis["function_errors"].get(function, 0) + 1
-                        analysis["recent_errors"].append(error_data)
-                    except:
-                        pass
+                if line.startswith(b"{"):
+                    # errors.log holds one JSON object per line
+                    payload = line
+                elif b"ERROR" in line:
+                    payload = line.partition(b"ERROR in ")[2].partition(b" | ")[2]
+                else:
+                    continue
+                
+                analysis["total_errors"] += 1
+                # Parse error details
+                try:
+                    error_data = orjson.loads(payload)
+                    error_type = error_data.get("error_type", "Unknown")
+                    function = error_data.get("function", "Unknown")
+                    
+                    analysis["error_types"][error_type] = analysis["error_types"].get(error_type, 0) + 1
+                    analysis["function_errors"][function] = analysis["function_errors"].get(function, 0) + 1
+                    analysis["recent_errors"].append(error_data)
+                except (orjson.JSONDecodeError, AttributeError):
+                    pass
     
     return analysis
 
@@ -5,12 +5,14 @@ Provides memory leak prevention and connection management
 
 import asyncio
 import gc
+import heapq
+import orjson
 import psutil
 import time
-from typing import Dict, List, Set, Optional, Any
+from typing import Dict, List, Set, Optional, Any, Tuple
 from datetime import datetime, timedelta
 import logging
-from collections import defaultdict
+from collections import defaultdict, deque
 import weakref
 
 logger = logging.getLogger(__name__)
@@ -19,26 +21,42 @@ logger = logging.getLogger(__name__)
 class MemoryMonitor:
     """Memory usage monitoring and management"""
     
+    # Seconds a psutil sample is reused before /proc is read again
+    USAGE_CACHE_TTL = 0.5
+    # Minimum seconds between collections forced by the memory check
+    FORCED_GC_INTERVAL = 300
+    
     def __init__(self):
         self.process = psutil.Process()
-        self.memory_history = []
+        self.memory_history = deque(maxlen=100)  # Keep only last 100 entries
         self.peak_memory = 0
         self.memory_threshold = 500 * 1024 * 1024  # 500MB threshold
         self.cleanup_threshold = 400 * 1024 * 1024  # 400MB cleanup threshold
+        self._usage_cache: Optional[Dict[str, Any]] = None
+        self._usage_cache_ts = 0.0
+        self._last_forced_gc = 0.0
     
-    def get_memory_usage(self) -> Dict[str, Any]:
-        """Get current memory usage statistics"""
+    def get_memory_usage(self, force: bool = False) -> Dict[str, Any]:
+        """Get current memory usage statistics, reusing a sample taken within the cache TTL"""
+        now = time.monotonic()
+        if not force and self._usage_cache is not None and now - self._usage_cache_ts < self.USAGE_CACHE_TTL:
+            return self._usage_cache
+        
         memory_info = self.process.memory_info()
-        memory_percent = self.process.memory_percent()
+        virtual_memory = psutil.virtual_memory()
+        # Same value as process.memory_percent(), without a second /proc/meminfo read
+        memory_percent = memory_info.rss / virtual_memory.total * 100
         
-        return {
+        self._usage_cache = {
             "rss": memory_info.rss,  # Resident Set Size
             "vms": memory_info.vms,  # Virtual Memory Size
             "percent": memory_percent,
-            "available": psutil.virtual_memory().available,
-            "total": psutil.virtual_memory().total,
-            "timestamp": datetime.now().isoformat()
+            "available": virtual_memory.available,
+            "total": virtual_memory.total,
+            "timestamp": time.time()  # Raw epoch seconds; formatted only when reported
         }
+        self._usage_cache_ts = now
+        return self._usage_cache
     
     def log_memory_usage(self, context: str = ""):
         """Log current memory usage"""
@@ -51,14 +69,9 @@ class MemoryMonitor:
         # Add to history
         self.memory_history.append({
             "context": context,
-            "timestamp": datetime.now(),
             **memory_stats
         })
         
-        # Keep only last 100 entries
-        if len(self.memory_history) > 100:
-            self.memory_history = self.memory_history[-100:]
-        
         # Check thresholds
         if memory_stats["rss"] > self.memory_threshold:
             logger.warning(f"🚨 High memory usage: {memory_stats['rss'] / 1024 / 1024:.1f}MB")
@@ -68,12 +81,12 @@ class MemoryMonitor:
     
     def force_garbage_collection(self):
         """Force garbage collection"""
-        before_gc = self.get_memory_usage()
+        before_gc = self.get_memory_usage(force=True)
         
         # Run garbage collection
         collected = gc.collect()
         
-        after_gc = self.get_memory_usage()
+        after_gc = self.get_memory_usage(force=True)
         freed_memory = before_gc["rss"] - after_gc["rss"]
         
         logger.info(f"🧹 Garbage collection: freed {freed_memory / 1024 / 1024:.1f}MB, collected {collected} objects")
@@ -83,6 +96,7 @@ class MemoryMonitor:
     def get_memory_summary(self) -> Dict[str, Any]:
         """Get memory usage summary"""
         current = self.get_memory_usage()
+        current = {**current, "timestamp": datetime.fromtimestamp(current["timestamp"]).isoformat()}
         
         return {
             "current": current,
@@ -93,12 +107,34 @@ class MemoryMonitor:
         }
 
 
+class Connection:
+    """State tracked for a single managed WebSocket connection"""
+    
+    # Hand-written slots: dataclass(slots=True) needs Python 3.10
+    __slots__ = ("websocket", "user_id", "room", "connected_at", "last_activity",
+                 "message_count", "is_active")
+    
+    def __init__(self, websocket: Any, user_id: Optional[str], room: Optional[str],
+                 connected_at: float, last_activity: float,
+                 message_count: int = 0, is_active: bool = True):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.room = room
+        self.connected_at = connected_at
+        self.last_activity = last_activity
+        self.message_count = message_count
+        self.is_active = is_active
+
+
 class WebSocketConnectionManager:
     """Optimized WebSocket connection management"""
     
     def __init__(self):
-        self.connections: Dict[str, Dict[str, Any]] = {}
+        self.connections: Dict[str, Connection] = {}
         self.rooms: Dict[str, Set[str]] = defaultdict(set)
+        self.user_connections: Dict[str, Set[str]] = defaultdict(set)
+        # Min-heap of (last_activity, connection_id); entries are refreshed lazily during cleanup
+        self._activity_heap: List[Tuple[float, str]] = []
         self.connection_limits = {
             "per_user": 5,
             "total": 1000,
@@ -116,26 +152,31 @@ class WebSocketConnectionManager:
     async def add_connection(self, connection_id: str, websocket, user_id: str = None, room: str = None):
         """Add a new WebSocket connection"""
         
-        # Check connection limits
+        # Check connection limits before allocating anything; there is no await between
+        # this check and the index updates below, so concurrent accepts can't both pass it
         if not self._check_connection_limits(user_id, room):
             logger.warning(f"🚫 Connection limit exceeded for user {user_id}")
             return False
         
         # Store connection info
-        self.connections[connection_id] = {
-            "websocket": websocket,
-            "user_id": user_id,
-            "room": room,
-            "connected_at": datetime.now(),
-            "last_activity": time.time(),
-            "message_count": 0,
-            "is_active": True
-        }
+        now = time.time()
+        self.connections[connection_id] = Connection(
+            websocket=websocket,
+            user_id=user_id,
+            room=room,
+            connected_at=now,
+            last_activity=now
+        )
+        heapq.heappush(self._activity_heap, (now, connection_id))
         
         # Add to room if specified
         if room:
             self.rooms[room].add(connection_id)
         
+        # Index by user for O(1) per-user limits and stats
+        if user_id:
+            self.user_connections[user_id].add(connection_id)
+        
         # Update stats
         self.connection_stats["total_connections"] += 1
         self.connection_stats["active_connections"] += 1
@@ -154,12 +195,20 @@ class WebSocketConnectionManager:
         connection = self.connections[connection_id]
         
         # Remove from room
-        if connection["room"]:
-            self.rooms[connection["room"]].discard(connection_id)
+        if connection.room:
+            self.rooms[connection.room].discard(connection_id)
+        
+        # Remove from user index
+        user_id = connection.user_id
+        if user_id:
+            user_connection_ids = self.user_connections[user_id]
+            user_connection_ids.discard(connection_id)
+            if not user_connection_ids:
+                del self.user_connections[user_id]
         
         # Close WebSocket
         try:
-            await connection["websocket"].close()
+            await connection.websocket.close()
         except Exception as e:
             logger.error(f"Error closing WebSocket {connection_id}: {e}")
         
@@ -173,9 +222,10 @@ class WebSocketConnectionManager:
     
     async def update_activity(self, connection_id: str):
         """Update connection activity timestamp"""
-        if connection_id in self.connections:
-            self.connections[connection_id]["last_activity"] = time.time()
-            self.connections[connection_id]["message_count"] += 1
+        connection = self.connections.get(connection_id)
+        if connection is not None:
+            connection.last_activity = time.time()
+            connection.message_count += 1
     
     async def cleanup_inactive_connections(self):
         """Clean up inactive connections"""
@@ -187,12 +237,20 @@ class WebSocketConnectionManager:
         
         inactive_connections = []
         
-        for connection_id, connection in self.connections.items():
-            time_since_activity = current_time - connection["last_activity"]
-            
-            # Mark as inactive if no activity for 10 minutes
-            if time_since_activity > 600:  # 10 minutes
+        # Mark as inactive if no activity for 10 minutes; only entries older than the
+        # cutoff are popped, so connections that are still active are never visited
+        cutoff = current_time - 600  # 10 minutes
+        heap = self._activity_heap
+        while heap and heap[0][0] < cutoff:
+            pushed_at, connection_id = heapq.heappop(heap)
+            connection = self.connections.get(connection_id)
+            if connection is None or pushed_at < connection.connected_at:
+                continue  # Already removed, or left over from an earlier connection with this id
+            if connection.last_activity < cutoff:
                 inactive_connections.append(connection_id)
+            else:
+                # Active since this entry was pushed: re-queue at its latest timestamp
+                heapq.heappush(heap, (connection.last_activity, connection_id))
         
         # Remove inactive connections
         for connection_id in inactive_connections:
@@ -213,14 +271,13 @@ class WebSocketConnectionManager:
         
         # Check per-user limit
         if user_id:
-            user_connections = sum(1 for conn in self.connections.values() 
-                                 if conn["user_id"] == user_id)
+            user_connections = len(self.user_connections.get(user_id, ()))
             if user_connections >= self.connection_limits["per_user"]:
                 return False
         
         # Check per-room limit
         if room:
-            room_connections = len(self.rooms[room])
+            room_connections = len(self.rooms.get(room, ()))
             if room_connections >= self.connection_limits["per_room"]:
                 return False
         
@@ -231,23 +288,36 @@ class WebSocketConnectionManager:
         if room not in self.rooms:
             return
         
+        # Snapshot membership so the room can change while sends are in flight
+        targets = []
         connections_to_remove = []
-        
-        for connection_id in self.rooms[room]:
-            if connection_id in self.connections:
-                connection = self.connections[connection_id]
-                try:
-                    await connection["websocket"].send_json(message)
-                    await self.update_activity(connection_id)
-                except Exception as e:
-                    logger.error(f"Error broadcasting to {connection_id}: {e}")
-                    connections_to_remove.append(connection_id)
+        ids = tuple(self.rooms[room])
+        for connection_id in ids:
+            connection = self.connections.get(connection_id)
+            if connection is None:
+                connections_to_remove.append(connection_id)
             else:
+                targets.append((connection_id, connection))
+        
+        # Encode once and send to every socket concurrently
+        payload = orjson.dumps(message).decode()
+        results = await asyncio.gather(
+            *(connection.websocket.send_text(payload) for _, connection in targets),
+            return_exceptions=True
+        )
+        
+        now = time.time()
+        for (connection_id, connection), result in zip(targets, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Error broadcasting to {connection_id}: {result}")
                 connections_to_remove.append(connection_id)
+            else:
+                connection.last_activity = now
+                connection.message_count += 1
         
         # Remove failed connections
-        for connection_id in connections_to_remove:
-            self.rooms[room].discard(connection_id)
+        if connections_to_remove:
+            self.rooms[room].difference_update(connections_to_remove)
     
     def get_connection_stats(self) -> Dict[str, Any]:
         """Get connection statistics"""
@@ -261,52 +331,127 @@ class WebSocketConnectionManager:
     
     def _get_connections_by_user(self) -> Dict[str, int]:
         """Get connection count by user"""
-        user_counts = defaultdict(int)
-        for connection in self.connections.values():
-            if connection["user_id"]:
-                user_counts[connection["user_id"]] += 1
-        return dict(user_counts)
+        return {user_id: len(connection_ids) for user_id, connection_ids in self.user_connections.items()}
 
 
 class ResourceManager:
     """Resource management and cleanup"""
     
+    # Seconds between full re-bucketing passes for resources that aged without being accessed
+    AGE_RECONCILE_INTERVAL = 60
+    
     def __init__(self):
-        self.resources: Dict[str, Any] = {}
+        # Per-resource metadata; the resource objects themselves live in _refs / _strong_refs
+        self.resources: Dict[str, Dict[str, Any]] = {}
+        # Weakly held resources are dropped as soon as their owner releases them
+        self._refs = weakref.WeakValueDictionary()
+        # Objects that can't be weakly referenced (dict, list, ...) are held strongly
+        self._strong_refs: Dict[str, Any] = {}
+        self._finalizers: Dict[str, weakref.finalize] = {}
         self.cleanup_callbacks: List[callable] = []
         self.cleanup_interval = 60  # 1 minute
         self.last_cleanup = time.time()
+        # Resource counts per age bucket, kept current on register/access/unregister
+        self._age_buckets = {
+            "recent": 0,      # < 1 hour
+            "old": 0,          # 1-24 hours
+            "very_old": 0      # > 24 hours
+        }
+        self._last_age_reconcile = time.time()
+    
+    @staticmethod
+    def _age_bucket(age_seconds: float) -> str:
+        """Age bucket name for a resource last accessed age_seconds ago"""
+        if age_seconds < 3600:
+            return "recent"
+        if age_seconds < 86400:
+            return "old"
+        return "very_old"
+    
+    def _set_age_bucket(self, resource_info: Dict[str, Any], bucket: Optional[str]):
+        """Move a resource between age buckets, keeping the counters in step"""
+        previous = resource_info.get("age_bucket")
+        if previous == bucket:
+            return
+        if previous is not None:
+            self._age_buckets[previous] -= 1
+        if bucket is not None:
+            self._age_buckets[bucket] += 1
+        resource_info["age_bucket"] = bucket
     
     def register_resource(self, resource_id: str, resource: Any, cleanup_callback: callable = None):
-        """Register a resource for management"""
-        self.resources[resource_id] = {
-            "resource": resource,
+        """Register a resource for management
+        
+        cleanup_callback(resource) runs when the resource is unregistered, either
+        explicitly or by the age-based sweep. It does not run for a weakly held
+        resource that is garbage collected first, since the resource is gone by then.
+        """
+        self._forget(resource_id)
+        
+        try:
+            self._refs[resource_id] = resource
+            self._finalizers[resource_id] = weakref.finalize(resource, self._on_resource_collected, resource_id)
+        except TypeError:
+            self._strong_refs[resource_id] = resource
+        
+        previous_info = self.resources.get(resource_id)
+        if previous_info is not None:
+            self._set_age_bucket(previous_info, None)
+        
+        resource_info = {
             "created_at": datetime.now(),
             "last_accessed": time.time(),
             "cleanup_callback": cleanup_callback
         }
+        self._set_age_bucket(resource_info, "recent")
+        self.resources[resource_id] = resource_info
         
         logger.debug(f"📦 Registered resource: {resource_id}")
     
+    def _forget(self, resource_id: str) -> Any:
+        """Drop all references to a resource and return it if it is still alive"""
+        finalizer = self._finalizers.pop(resource_id, None)
+        if finalizer is not None:
+            finalizer.detach()
+        resource = self._refs.pop(resource_id, None)
+        if resource is None:
+            resource = self._strong_refs.pop(resource_id, None)
+        return resource
+    
+    def _on_resource_collected(self, resource_id: str):
+        """Forget a weakly held resource once it has been garbage collected
+        
+        Only bookkeeping is dropped; the cleanup callback needs the live resource.
+        """
+        self._finalizers.pop(resource_id, None)
+        resource_info = self.resources.pop(resource_id, None)
+        if resource_info is not None:
+            self._set_age_bucket(resource_info, None)
+        logger.debug(f"♻️ Resource collected: {resource_id}")
+    
     def unregister_resource(self, resource_id: str):
         """Unregister a resource"""
         if resource_id in self.resources:
             resource_info = self.resources[resource_id]
+            resource = self._forget(resource_id)
             
             # Call cleanup callback if available
-            if resource_info["cleanup_callback"]:
+            if resource_info["cleanup_callback"] and resource is not None:
                 try:
-                    resource_info["cleanup_callback"](resource_info["resource"])
+                    resource_info["cleanup_callback"](resource)
                 except Exception as e:
                     logger.error(f"Error in cleanup callback for {resource_id}: {e}")
             
+            self._set_age_bucket(resource_info, None)
             del self.resources[resource_id]
             logger.debug(f"🗑️ Unregistered resource: {resource_id}")
     
     def access_resource(self, resource_id: str):
         """Mark resource as accessed"""
-        if resource_id in self.resources:
-            self.resources[resource_id]["last_accessed"] = time.time()
+        resource_info = self.resources.get(resource_id)
+        if resource_info is not None:
+            resource_info["last_accessed"] = time.time()
+            self._set_age_bucket(resource_info, "recent")
     
     async def cleanup_unused_resources(self, max_age: int = 3600):
         """Clean up unused resources older than max_age seconds"""
@@ -318,7 +463,8 @@ class ResourceManager:
         
         resources_to_remove = []
         
-        for resource_id, resource_info in self.resources.items():
+        # Snapshot: finalizers may drop entries while we iterate
+        for resource_id, resource_info in list(self.resources.items()):
             age = current_time - resource_info["last_accessed"]
             
             if age > max_age:
@@ -333,30 +479,25 @@ class ResourceManager:
         if resources_to_remove:
             logger.info(f"🧹 Cleaned up {len(resources_to_remove)} unused resources")
     
+    def _reconcile_age_buckets(self, current_time: float):
+        """Re-bucket every resource, catching those that aged without being accessed"""
+        # Snapshot: finalizers may drop entries while we iterate
+        for resource_info in list(self.resources.values()):
+            self._set_age_bucket(resource_info, self._age_bucket(current_time - resource_info["last_accessed"]))
+        self._last_age_reconcile = current_time
+    
     def get_resource_stats(self) -> Dict[str, Any]:
         """Get resource statistics"""
         current_time = time.time()
         
-        stats = {
+        # Counters are maintained incrementally; a full pass only runs once per interval
+        if current_time - self._last_age_reconcile >= self.AGE_RECONCILE_INTERVAL:
+            self._reconcile_age_buckets(current_time)
+        
+        return {
             "total_resources": len(self.resources),
-            "resources_by_age": {
-                "recent": 0,      # < 1 hour
-                "old": 0,          # 1-24 hours
-                "very_old": 0      # > 24 hours
-            }
+            "resources_by_age": self._age_buckets.copy()
         }
-        
-        for resource_info in self.resources.values():
-            age_hours = (current_time - resource_info["last_accessed"]) / 3600
-            
-            if age_hours < 1:
-                stats["resources_by_age"]["recent"] += 1
-            elif age_hours < 24:
-                stats["resources_by_age"]["old"] += 1
-            else:
-                stats["resources_by_age"]["very_old"] += 1
-        
-        return stats
 
 
 # Global instances
@@ -368,25 +509,52 @@ resource_manager = ResourceManager()
 class MemoryOptimizationService:
     """Centralized memory optimization service"""
     
+    # Minimum gen-0 allocation threshold while the service runs; async task churn is mostly freed by refcounting
+    GC_GEN0_THRESHOLD = 50_000
+    
     def __init__(self):
         self.optimization_enabled = True
         self.cleanup_schedule = []
+        self._original_gc_threshold = None
+        # Strong references to the periodic tasks; the event loop only holds them weakly
+        self._tasks: List[asyncio.Task] = []
+        # Whether RSS was above the cleanup threshold at the last check
+        self._memory_high = False
+        # Loop the gc callback hands memory checks to, and whether one is already queued
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._gc_check_pending = False
     
     async def start_optimization(self):
         """Start memory optimization service"""
+        if self._tasks:
+            return
+        
         logger.info("🚀 Starting memory optimization service")
+        self.optimization_enabled = True
+        
+        # Collect less often: the defaults trigger gen-0 passes constantly under async load
+        if self._original_gc_threshold is None:
+            self._original_gc_threshold = gc.get_threshold()
+            gen0, gen1, gen2 = self._original_gc_threshold
+            gc.set_threshold(max(gen0, self.GC_GEN0_THRESHOLD), gen1 * 2, gen2 * 2)
+        
+        # Check memory as soon as a full collection finishes; the timer is only a fallback
+        self._loop = asyncio.get_running_loop()
+        if self._gc_callback not in gc.callbacks:
+            gc.callbacks.append(self._gc_callback)
         
         # Schedule periodic cleanup
         self.cleanup_schedule = [
             self._periodic_memory_check,
             self._periodic_websocket_cleanup,
-            self._periodic_resource_cleanup,
-            self._periodic_garbage_collection
+            self._periodic_resource_cleanup
         ]
         
         # Start cleanup tasks
-        for cleanup_task in self.cleanup_schedule:
-            asyncio.create_task(self._run_periodic_task(cleanup_task))
+        self._tasks = [
+            asyncio.create_task(self._run_periodic_task(cleanup_task), name=cleanup_task.__name__)
+            for cleanup_task in self.cleanup_schedule
+        ]
     
     async def _run_periodic_task(self, task_func):
         """Run a periodic task"""
@@ -394,16 +562,60 @@ class MemoryOptimizationService:
             try:
                 await task_func()
                 await asyncio.sleep(60)  # Run every minute
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.error(f"Error in periodic task {task_func.__name__}: {e}")
                 await asyncio.sleep(60)
     
+    def _gc_callback(self, phase: str, info: Dict[str, Any]):
+        """Queue a memory check on the event loop when a gen-2 collection completes
+        
+        Runs inside the collector, possibly in the middle of a logging handler's
+        emit and on any thread, so it must not log or call into psutil; the check
+        itself runs later as a loop callback.
+        """
+        if phase != "stop" or info.get("generation", 0) < 2:
+            return
+        if self._gc_check_pending or self._loop is None:
+            return
+        self._gc_check_pending = True
+        try:
+            self._loop.call_soon_threadsafe(self._on_full_gc)
+        except RuntimeError:
+            # Loop already closed
+            self._gc_check_pending = False
+    
+    def _on_full_gc(self):
+        """Sample memory right after a full collection"""
+        self._gc_check_pending = False
+        self._check_memory("full_gc")
+    
     async def _periodic_memory_check(self):
-        """Periodic memory usage check"""
-        high_memory = memory_monitor.log_memory_usage("periodic_check")
+        """Sample memory on a timer
         
-        if high_memory:
-            # Force garbage collection
+        Raised thresholds make full collections rare, and memory held outside
+        GC-tracked objects never triggers one, so RSS is also sampled here.
+        """
+        self._check_memory("periodic")
+    
+    def _check_memory(self, context: str):
+        """Record a memory sample, log cleanup threshold crossings and force GC if needed"""
+        memory_monitor.log_memory_usage(context)
+        rss = memory_monitor.get_memory_usage()["rss"]
+        
+        high_memory = rss > memory_monitor.cleanup_threshold
+        if high_memory != self._memory_high:
+            self._memory_high = high_memory
+            if high_memory:
+                logger.warning(f"🚨 Memory above cleanup threshold ({context}): {rss / 1024 / 1024:.1f}MB")
+            else:
+                logger.info(f"✅ Memory back under cleanup threshold: {rss / 1024 / 1024:.1f}MB")
+        
+        # Only force a collection under pressure, and at most once per interval
+        now = time.time()
+        if high_memory and now - memory_monitor._last_forced_gc > memory_monitor.FORCED_GC_INTERVAL:
+            memory_monitor._last_forced_gc = now
             memory_monitor.force_garbage_collection()
     
     async def _periodic_websocket_cleanup(self):
@@ -414,13 +626,26 @@ class MemoryOptimizationService:
         """Periodic resource cleanup"""
         await resource_manager.cleanup_unused_resources()
     
-    async def _periodic_garbage_collection(self):
-        """Periodic garbage collection"""
-        memory_monitor.force_garbage_collection()
-    
     async def stop_optimization(self):
         """Stop memory optimization service"""
         self.optimization_enabled = False
+        
+        # Cancel the periodic tasks and wait for them to unwind
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        
+        if self._gc_callback in gc.callbacks:
+            gc.callbacks.remove(self._gc_callback)
+        self._loop = None
+        self._gc_check_pending = False
+        
+        # Restore the interpreter's GC thresholds
+        if self._original_gc_threshold is not None:
+            gc.set_threshold(*self._original_gc_threshold)
+            self._original_gc_threshold = None
+        
         logger.info("🛑 Memory optimization service stopped")
     
     def get_optimization_status(self) -> Dict[str, Any]:
@@ -2,13 +2,18 @@
 Ollama AI Client for GPT-OSS-20B Integration
 Provides AI-powered analysis for project management dashboard
 """
+import asyncio
+import hashlib
 import httpx
-import json
-from typing import Dict, List, Any, Optional
+import orjson
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Any, Optional
 from app.core.logging import get_logger
 
 logger = get_logger("core.ollama_client")
 
+_ANALYSIS_INSTRUCTIONS = "Please provide a comprehensive analysis based on the context data above. Focus on actionable insights, trends, and recommendations."
+
 class OllamaClient:
     """Client for interacting with Ollama GPT-OSS-20B model"""
     
@@ -16,56 +21,102 @@ class OllamaClient:
         self.base_url = base_url
         self.model_name = "gpt-oss-20b"
         self.timeout = 30.0
+        # Shared client so requests reuse keep-alive connections
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=self.timeout,
+            limits=httpx.Limits(max_keepalive_connections=10, max_connections=20)
+        )
+        # LRU of completed analyses keyed on a digest of prompt + context
+        self._cache: "OrderedDict[bytes, str]" = OrderedDict()
+        self._cache_maxsize = 256
+    
+    async def aclose(self):
+        """Close the pooled HTTP client"""
+        await self._client.aclose()
+        
+    async def stream_analysis(self, prompt: str, context: Dict[str, Any] = None) -> AsyncIterator[str]:
+        """Stream AI analysis from GPT-OSS-20B, yielding text chunks as they are generated"""
+        # Prepare the full prompt with context
+        full_prompt = self._prepare_prompt(prompt, context)
         
-    async def generate_analysis(self, prompt: str, context: Dict[str, Any] = None) -> str:
+        # Make streaming request to Ollama API
+        async with self._client.stream(
+            "POST",
+            "/api/generate",
+            json={
+                "model": self.model_name,
+                "prompt": full_prompt,
+                "stream": True,
+                "options": {
+                    "temperature": 0.7,
+                    "top_p": 0.9,
+                    "max_tokens": 2000
+                }
+            }
+        ) as response:
+            if response.status_code != 200:
+                await response.aread()
+                response.raise_for_status()
+            
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                part = orjson.loads(line)
+                chunk = part.get("response", "")
+                if chunk:
+                    yield chunk
+                if part.get("done"):
+                    break
+    
+    def _cache_key(self, prompt: str, context: Optional[Dict[str, Any]]) -> bytes:
+        """Content-addressed key for a prompt and its context"""
+        # default=str covers Decimal (Numeric columns), sets and other non-JSON types
+        context_bytes = orjson.dumps(context or {}, default=str, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+        return hashlib.sha256(prompt.encode() + context_bytes).digest()
+    
+    async def generate_analysis(self, prompt: str, context: Dict[str, Any] = None, cache: bool = True) -> str:
         """Generate AI analysis using GPT-OSS-20B model"""
+        key = None
         try:
-            # Prepare the full prompt with context
-            full_prompt = self._prepare_prompt(prompt, context)
+            if cache:
+                key = self._cache_key(prompt, context)
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    return cached
             
-            # Make request to Ollama API
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    f"{self.base_url}/api/generate",
-                    json={
-                        "model": self.model_name,
-                        "prompt": full_prompt,
-                        "stream": False,
-                        "options": {
-                            "temperature": 0.7,
-                            "top_p": 0.9,
-                            "max_tokens": 2000
-                        }
-                    }
-                )
+            chunks = [chunk async for chunk in self.stream_analysis(prompt, context)]
+            result = "".join(chunks)
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    return result.get("response", "No response generated")
-                else:
-                    logger.error(f"Ollama API error: {response.status_code} - {response.text}")
-                    return "AI analysis temporarily unavailable"
-                    
         except httpx.TimeoutException:
             logger.error("Ollama API timeout")
             return "AI analysis request timed out"
+        except httpx.HTTPStatusError as e:
+            logger.error(f"Ollama API error: {e.response.status_code} - {e.response.text}")
+            return "AI analysis temporarily unavailable"
         except Exception as e:
             logger.error(f"Ollama API error: {str(e)}")
             return "AI analysis service unavailable"
+        
+        if not result:
+            return "No response generated"
+        
+        # Only successful generations are cached; failures are retried next time
+        if key is not None:
+            self._cache[key] = result
+            if len(self._cache) > self._cache_maxsize:
+                self._cache.popitem(last=False)
+        return result
     
     def _prepare_prompt(self, prompt: str, context: Dict[str, Any] = None) -> str:
         """Prepare the full prompt with context"""
         if not context:
             return prompt
             
-        context_str = json.dumps(context, indent=2)
-        return f"""Context Data:
-{context_str}
-
-Analysis Request:
-{prompt}
-
-Please provide a comprehensive analysis based on the context data above. Focus on actionable insights, trends, and recommendations."""
+        # Compact encoding keeps the prompt (and the tokens the model must read) small
+        context_str = orjson.dumps(context, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+        return f"Context Data:\n{context_str}\n\nAnalysis Request:\n{prompt}\n\n{_ANALYSIS_INSTRUCTIONS}"
     
     async def analyze_project_health(self, project_data: Dict[str, Any]) -> str:
         """Analyze project health and provide insights"""
@@ -132,6 +183,33 @@ Provide executive-level insights that drive business value."""
 Include confidence levels and supporting rationale."""
         
         return await self.generate_analysis(prompt, project_data)
+    
+    async def analyze_dashboard(self, dashboard_data: Dict[str, Any]) -> Dict[str, str]:
+        """Run all dashboard analyses concurrently and return them keyed by section"""
+        project_data = dashboard_data.get("project", dashboard_data)
+        results = await asyncio.gather(
+            self.analyze_project_health(project_data),
+            self.analyze_financial_performance(dashboard_data.get("financial", dashboard_data)),
+            self.analyze_resource_utilization(dashboard_data.get("resources", dashboard_data)),
+            self.generate_strategic_recommendations(dashboard_data),
+            self.predict_project_outcomes(project_data),
+            return_exceptions=True
+        )
+        
+        sections = (
+            "project_health",
+            "financial_performance",
+            "resource_utilization",
+            "strategic_recommendations",
+            "project_outcomes",
+        )
+        analysis = {}
+        for section, result in zip(sections, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Dashboard analysis '{section}' failed: {str(result)}")
+                result = "AI analysis service unavailable"
+            analysis[section] = result
+        return analysis
 
 # Global instance
 ollama_client = OllamaClient()
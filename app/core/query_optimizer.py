@@ -3,11 +3,18 @@ Database Query Optimization
 Provides optimized query methods and N+1 query prevention
 """
 
+import asyncio
+import functools
+import hashlib
+import time
 from sqlalchemy.orm import joinedload, selectinload, subqueryload
-from sqlalchemy import func, and_, or_
-from typing import List, Dict, Any, Optional
+from sqlalchemy import create_engine, event, func, and_, or_
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from typing import List, Dict, Any, Optional, Tuple
 import logging
 
+from app.core.performance import performance_monitor
+
 logger = logging.getLogger(__name__)
 
 
@@ -20,15 +27,19 @@ class QueryOptimizer:
         
         # Optimized query for projects with all related data
         def get_projects_with_relations():
+            # joinedload only for many-to-one scalars; collections use selectinload so each
+            # level is one IN (...) query instead of multiplying the row count of the join
             return session.query(Project).options(
                 joinedload(Project.status),
                 joinedload(Project.priority),
                 joinedload(Project.criticality),
-                joinedload(Project.features).joinedload(Feature.status),
-                joinedload(Project.features).joinedload(Feature.priority),
-                joinedload(Project.features).joinedload(Feature.backlogs).joinedload(Backlog.status),
-                joinedload(Project.resources),
-                joinedload(Project.functions)
+                selectinload(Project.features).options(
+                    joinedload(Feature.status),
+                    joinedload(Feature.priority),
+                    selectinload(Feature.backlogs).joinedload(Backlog.status)
+                ),
+                selectinload(Project.resources),
+                selectinload(Project.functions)
             ).filter(Project.is_active == True)
         
         return get_projects_with_relations
@@ -107,14 +118,63 @@ class PaginatedQuery:
         offset = (self.page - 1) * self.per_page
         return self.query.offset(offset).limit(self.per_page)
     
+    def keyset_paginate(self, last_seen_id: Any = None, key_column=None):
+        """Apply keyset pagination (WHERE key > last_seen ORDER BY key) to query
+        
+        Unlike OFFSET, the cost does not grow with page depth. key_column defaults
+        to the id of the query's primary entity.
+        """
+        if key_column is None:
+            key_column = self.query.column_descriptions[0]['entity'].id
+        
+        query = self.query
+        if last_seen_id is not None:
+            query = query.filter(key_column > last_seen_id)
+        return query.order_by(key_column).limit(self.per_page)
+    
+    def _fetch_page(self, session):
+        """Fetch one page together with the total row count, in a single query where possible"""
+        offset = (self.page - 1) * self.per_page
+        descriptions = self.query.column_descriptions
+        column_count = len(descriptions)
+        # Match Query.all(): rows holding ORM entities are de-duplicated, column rows are not,
+        # and a single entity comes back as bare objects rather than Rows
+        entity_columns = [desc['expr'] is desc['entity'] for desc in descriptions]
+        single_entity = column_count == 1 and entity_columns[0]
+        
+        if getattr(self.query, '_distinct', False):
+            # A window count runs before DISTINCT and would count duplicate rows
+            data = self.query.offset(offset).limit(self.per_page).all()
+            total_count = self.query.order_by(None).count()
+            return data, total_count
+        
+        # COUNT(*) OVER () is evaluated before OFFSET/LIMIT, so every row carries the full total
+        paged = self.query.add_columns(func.count().over().label('_total'))\
+            .offset(offset).limit(self.per_page)
+        result = session.execute(paged.statement)
+        if any(entity_columns):
+            # Also required by joined eager collections, which repeat each entity per child row
+            result = result.unique()
+        frozen = result.freeze()
+        rows = frozen().all()
+        
+        if rows:
+            total_count = rows[0][-1]
+        elif self.page > 1:
+            # Past the last page there are no rows to carry the total; count separately
+            total_count = session.query(self.query.subquery()).count()
+        else:
+            total_count = 0
+        
+        # Re-read the buffered rows without the count column so Row named access is kept
+        page = frozen().columns(*range(column_count))
+        data = page.scalars().all() if single_entity else page.all()
+        return data, total_count
+    
     async def get_paginated_result(self, session):
         """Get paginated result with metadata"""
-        # Get total count
-        total_count = session.query(self.query.subquery()).count()
-        
-        # Get paginated data
-        paginated_query = self.paginate()
-        data = paginated_query.all()
+        # The caller's Session is not thread-safe, so the page is fetched on this thread
+        data, total_count = self._fetch_page(session)
         
         # Calculate pagination metadata
         total_pages = (total_count + self.per_page - 1) // self.per_page
@@ -140,6 +200,10 @@ class QueryPerformanceMonitor:
     def __init__(self):
         self.slow_query_threshold = 1.0  # seconds
         self.query_stats = {}
+        # Running totals across all queries so the summary needs no reduction passes
+        self.total_queries = 0
+        self.total_slow_queries = 0
+        self.total_time = 0.0
     
     def log_query_performance(self, query_name: str, execution_time: float, 
                              row_count: int = None, query_sql: str = None):
@@ -153,7 +217,9 @@ class QueryPerformanceMonitor:
                 "avg_time": 0,
                 "max_time": 0,
                 "min_time": float('inf'),
-                "slow_queries": 0
+                "slow_queries": 0,
+                # Readable SQL for keys that are statement hashes (see instrument_engine)
+                "statement": query_sql[:200] if query_sql else None
             }
         
         stats = self.query_stats[query_name]
@@ -162,9 +228,12 @@ class QueryPerformanceMonitor:
         stats["avg_time"] = stats["total_time"] / stats["count"]
         stats["max_time"] = max(stats["max_time"], execution_time)
         stats["min_time"] = min(stats["min_time"], execution_time)
+        self.total_queries += 1
+        self.total_time += execution_time
         
         if execution_time > self.slow_query_threshold:
             stats["slow_queries"] += 1
+            self.total_slow_queries += 1
             logger.warning(f"🐌 Slow query detected: {query_name} took {execution_time:.3f}s")
             
             if query_sql:
@@ -177,15 +246,14 @@ class QueryPerformanceMonitor:
     def get_performance_summary(self) -> Dict[str, Any]:
         """Get query performance summary"""
         summary = {
-            "total_queries": sum(stats["count"] for stats in self.query_stats.values()),
-            "slow_queries": sum(stats["slow_queries"] for stats in self.query_stats.values()),
+            "total_queries": self.total_queries,
+            "slow_queries": self.total_slow_queries,
             "avg_execution_time": 0,
             "queries": {}
         }
         
-        total_time = sum(stats["total_time"] for stats in self.query_stats.values())
-        if summary["total_queries"] > 0:
-            summary["avg_execution_time"] = total_time / summary["total_queries"]
+        if self.total_queries > 0:
+            summary["avg_execution_time"] = self.total_time / self.total_queries
         
         for query_name, stats in self.query_stats.items():
             summary["queries"][query_name] = {
@@ -193,7 +261,8 @@ class QueryPerformanceMonitor:
                 "avg_time": stats["avg_time"],
                 "max_time": stats["max_time"],
                 "min_time": stats["min_time"],
-                "slow_queries": stats["slow_queries"]
+                "slow_queries": stats["slow_queries"],
+                "statement": stats["statement"]
             }
         
         return summary
@@ -203,39 +272,57 @@ class QueryPerformanceMonitor:
 query_monitor = QueryPerformanceMonitor()
 
 
-def monitor_query_performance(query_name: str):
-    """Decorator to monitor query performance"""
-    def decorator(func):
-        async def wrapper(*args, **kwargs):
-            import time
-            start_time = time.time()
-            
-            try:
-                result = await func(*args, **kwargs)
-                execution_time = time.time() - start_time
-                
-                # Log performance
-                row_count = len(result) if isinstance(result, (list, tuple)) else None
-                query_monitor.log_query_performance(
-                    query_name, execution_time, row_count
-                )
-                
-                return result
-                
-            except Exception as e:
-                execution_time = time.time() - start_time
-                query_monitor.log_query_performance(
-                    query_name, execution_time, 0, str(e)
-                )
-                raise
-        
-        return wrapper
-    return decorator
+@functools.lru_cache(maxsize=1024)
+def _statement_key(statement: str) -> str:
+    """Stable short key grouping executions of the same SQL statement"""
+    return "sql:" + hashlib.blake2b(statement.encode(), digest_size=8).hexdigest()
+
+
+def instrument_engine(engine):
+    """Time every SQL statement the engine executes and feed query_monitor
+    
+    Cursor events see every statement, including ORM lazy loads, with driver
+    and network time included, so query functions need no per-call decorator.
+    """
+    # Cursor events can't be registered on an AsyncEngine; they live on its sync engine
+    engine = getattr(engine, "sync_engine", engine)
+    
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # context is None for some DDL/driver-level executions
+        if context is not None:
+            context._query_start_time = time.perf_counter()
+    
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start_time = getattr(context, "_query_start_time", None)
+        if start_time is None:
+            return
+        execution_time = time.perf_counter() - start_time
+        row_count = cursor.rowcount if cursor.rowcount >= 0 else None
+        query_monitor.log_query_performance(
+            _statement_key(statement), execution_time, row_count, statement
+        )
 
 
 class DatabaseConnectionPool:
     """Database connection pool management"""
     
+    # Pool settings applied by create_optimized_engine
+    OPTIMAL_POOL_SETTINGS = {
+        "pool_size": 20,        # Base pool size
+        "max_overflow": 30,      # Additional connections
+        "pool_timeout": 30,      # Timeout for getting connection
+        "pool_recycle": 1800,    # Recycle connections after 30 minutes
+        "pool_pre_ping": True    # Test connections before use
+    }
+    
+    # Async drivers that need create_async_engine and AsyncAdaptedQueuePool
+    ASYNC_DRIVERS = ("asyncpg", "psycopg_async", "aiosqlite")
+    
+    # Share of pool capacity (pool_size + max_overflow) checked out before pool_checked_out alerts
+    SATURATION_ALERT_RATIO = 0.9
+    
     def __init__(self, engine):
         self.engine = engine
         self.pool_stats = {
@@ -246,9 +333,26 @@ class DatabaseConnectionPool:
             "invalid": 0
         }
     
+    @classmethod
+    def create_optimized_engine(cls, url: str, **overrides):
+        """Create an engine with the optimized pool settings applied"""
+        settings = {**cls.OPTIMAL_POOL_SETTINGS, **overrides}
+        driver = url.split("://", 1)[0].partition("+")[2]
+        
+        if driver in cls.ASYNC_DRIVERS:
+            from sqlalchemy.ext.asyncio import create_async_engine
+            return create_async_engine(url, poolclass=AsyncAdaptedQueuePool, **settings)
+        
+        return create_engine(url, poolclass=QueuePool, **settings)
+    
+    @property
+    def _pool(self):
+        """Underlying pool for both sync and async engines"""
+        return getattr(self.engine, "sync_engine", self.engine).pool
+    
     def get_pool_status(self) -> Dict[str, Any]:
         """Get connection pool status"""
-        pool = self.engine.pool
+        pool = self._pool
         
         return {
             "pool_size": pool.size(),
@@ -259,43 +363,62 @@ class DatabaseConnectionPool:
             "total_connections": pool.size() + pool.overflow()
         }
     
-    def optimize_pool_settings(self):
-        """Optimize connection pool settings"""
-        # These settings should be configured in database configuration
-        optimal_settings = {
-            "pool_size": 20,        # Base pool size
-            "max_overflow": 30,      # Additional connections
-            "pool_timeout": 30,      # Timeout for getting connection
-            "pool_recycle": 3600,    # Recycle connections after 1 hour
-            "pool_pre_ping": True    # Test connections before use
-        }
+    def get_pool_capacity(self) -> Optional[int]:
+        """Most connections the pool hands out (pool_size + max_overflow); None if unbounded"""
+        pool = self._pool
+        max_overflow = getattr(pool, "_max_overflow", 0)
+        if max_overflow < 0:
+            return None
+        return pool.size() + max_overflow
+    
+    async def monitor_pool(self, interval: float = 10.0):
+        """Record checked-out connections every interval seconds for saturation alerts"""
+        capacity = self.get_pool_capacity()
+        if capacity:
+            performance_monitor.alert_thresholds["pool_checked_out"] = capacity * self.SATURATION_ALERT_RATIO
         
-        logger.info(f"🔧 Recommended pool settings: {optimal_settings}")
-        return optimal_settings
+        while True:
+            performance_monitor.record_metric("pool_checked_out", self._pool.checkedout())
+            await asyncio.sleep(interval)
 
 
 # Query optimization utilities
-def prevent_n_plus_one(query, relations: List[str]):
-    """Prevent N+1 queries by eager loading relations"""
+@functools.lru_cache(maxsize=128)
+def _eager_load_options(entity, relations: Tuple[str, ...]) -> tuple:
+    """Build (once per entity and relation set) the loader options for prevent_n_plus_one
+    
+    Collections use selectinload, which adds one IN (...) query per level instead of
+    multiplying rows the way a joined collection does; scalars use joinedload.
+    """
     options = []
     
     for relation in relations:
-        if '.' in relation:
-            # Handle nested relations (e.g., 'features.backlogs')
-            parts = relation.split('.')
-            current_option = joinedload(getattr(query.column_descriptions[0]['entity'], parts[0]))
-            for part in parts[1:]:
-                current_option = current_option.joinedload(part)
-            options.append(current_option)
-        else:
-            # Handle direct relations
-            options.append(joinedload(getattr(query.column_descriptions[0]['entity'], relation)))
+        # Handle nested relations (e.g., 'features.backlogs') by walking the mappers
+        current_entity = entity
+        option = None
+        for part in relation.split('.'):
+            attribute = getattr(current_entity, part)
+            loader = selectinload if attribute.property.uselist else joinedload
+            option = loader(attribute) if option is None else getattr(option, loader.__name__)(attribute)
+            current_entity = attribute.property.mapper.class_
+        options.append(option)
     
-    return query.options(*options)
+    return tuple(options)
+
+
+def prevent_n_plus_one(query, relations: List[str]):
+    """Prevent N+1 queries by eager loading relations"""
+    entity = query.column_descriptions[0]['entity']
+    return query.options(*_eager_load_options(entity, tuple(relations)))
 
 
 def optimize_bulk_operations(session, model_class, operations: List[Dict]):
-    """Optimize bulk database operations"""
+    """Optimize bulk database operations
+    
+    All statements run in the session's current transaction, so the caller
+    pays for a single commit. Multi-row INSERT/UPDATE batching relies on the
+    engine's executemany_mode (see app.database).
+    """
     
     # Group operations by type
     inserts = [op for op in operations if op['type'] == 'insert']
@@ -312,9 +435,16 @@ def optimize_bulk_operations(session, model_class, operations: List[Dict]):
         logger.info(f"📝 Bulk updated {len(updates)} records")
     
     if deletes:
-        # For deletes, we need to use bulk_delete_mappings or individual deletes
+        # Deletes by primary key collapse into one DELETE ... WHERE id IN (...)
+        delete_ids = [op['filters']['id'] for op in deletes if op['filters'].keys() == {'id'}]
+        if delete_ids:
+            session.query(model_class).filter(model_class.id.in_(delete_ids))\
+                .delete(synchronize_session=False)
+        
+        # Anything filtered on other columns still needs its own statement
         for delete_op in deletes:
-            session.query(model_class).filter_by(**delete_op['filters']).delete()
+            if delete_op['filters'].keys() != {'id'}:
+                session.query(model_class).filter_by(**delete_op['filters']).delete()
         logger.info(f"🗑️ Bulk deleted {len(deletes)} records")
     
     return len(operations)
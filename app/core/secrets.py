@@ -3,23 +3,180 @@ Enhanced Secrets Management for GenAI Metrics Dashboard
 Implements secure secrets handling with encryption and validation
 """
 import os
+import asyncio
 import base64
+import ctypes
+import ctypes.util
+import hashlib
+import hmac
 import secrets
-from typing import Optional, Dict, Any
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple, Union
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 import logging
 
 logger = logging.getLogger(__name__)
 
+# PBKDF2-HMAC-SHA256 parameters; changing them invalidates stored password hashes
+PBKDF2_ITERATIONS = 100000
+PBKDF2_KEY_LENGTH = 32
+
+# scrypt parameters for new password hashes, stored as "scrypt$" + base64(key)
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SCRYPT_HASH_PREFIX = "scrypt$"
+
+# Ciphertexts produced by encrypt_secret: prefix + base64(nonce || ciphertext || tag).
+# Values without the prefix are legacy base64-wrapped Fernet tokens.
+AESGCM_PREFIX = "v2:"
+AESGCM_NONCE_SIZE = 12
+# Every Fernet token starts with version byte 0x80, i.e. "gAAAAA" once base64-encoded
+FERNET_TOKEN_PREFIX = "gAAAAA"
+
+# Bounds for the per-process cache of resolved secrets
+SECRETS_CACHE_SIZE = 512
+SECRETS_CACHE_TTL = 300
+
+# Best-effort mlock/munlock for the cache's own copy of each plaintext secret.
+# This is hygiene, not protection: get_secret hands callers an immutable str,
+# and plaintext (or ciphertext) values also live in os.environ, neither of
+# which can be pinned or wiped.
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    _mlock, _munlock = _libc.mlock, _libc.munlock
+except (OSError, AttributeError, TypeError):
+    _mlock = _munlock = None
+
+
+def _buffer_address(buffer: bytearray) -> ctypes.c_void_p:
+    """Address of a bytearray's storage"""
+    return ctypes.c_void_p(ctypes.addressof((ctypes.c_char * len(buffer)).from_buffer(buffer)))
+
+
+def _lock_memory(buffer: bytearray) -> None:
+    """Pin a buffer's pages in RAM where the platform allows it (failures are ignored)"""
+    if _mlock is None or not buffer:
+        return
+    _mlock(_buffer_address(buffer), ctypes.c_size_t(len(buffer)))
+
+
+def _wipe(buffer: bytearray) -> None:
+    """Overwrite a buffer with zeros in place, then release its page locks
+    
+    Page locks don't nest, so this may also unpin a page shared with another
+    cached value; that only makes the lock best-effort, never leaks RLIMIT_MEMLOCK.
+    """
+    if not buffer:
+        return
+    buffer[:] = bytes(len(buffer))
+    if _munlock is not None:
+        _munlock(_buffer_address(buffer), ctypes.c_size_t(len(buffer)))
+
+# Bytes fetched from the kernel CSPRNG per refill of the token randomness pool
+RANDOM_POOL_SIZE = 4096
+
+# Character classes for validate_secret_strength; a bytes.translate table indexed by byte value
+CLASS_UPPER, CLASS_LOWER, CLASS_DIGIT, CLASS_SPECIAL = 1, 2, 4, 8
+SPECIAL_CHARACTERS = frozenset("!@#$%^&*()_+-=[]{}|;:,.<>?")
+_CHAR_CLASSES = bytes(
+    (CLASS_UPPER if chr(i).isupper() else 0)
+    | (CLASS_LOWER if chr(i).islower() else 0)
+    | (CLASS_DIGIT if chr(i).isdigit() else 0)
+    | (CLASS_SPECIAL if chr(i) in SPECIAL_CHARACTERS else 0)
+    for i in range(256)
+)
+
+# Issue reported by validate_secret_strength for each missing character class
+CHARACTER_CLASS_ISSUES = (
+    (CLASS_UPPER, "Should contain uppercase letters"),
+    (CLASS_LOWER, "Should contain lowercase letters"),
+    (CLASS_DIGIT, "Should contain numbers"),
+    (CLASS_SPECIAL, "Should contain special characters"),
+)
+
+# Common weak passwords, compared case-insensitively
+WEAK_PASSWORDS = frozenset({
+    "password", "123456", "admin", "qwerty", "letmein",
+    "welcome", "monkey", "dragon", "master", "hello"
+})
+
+
+def _classify_characters(secret: str) -> int:
+    """Bitmask of the character classes present in a secret, in a single pass"""
+    if secret.isascii():
+        # translate() classifies every byte in C; only the distinct class values are OR-ed
+        mask = 0
+        for classes in set(secret.encode().translate(_CHAR_CLASSES)):
+            mask |= classes
+        return mask
+    
+    # Non-ASCII input keeps full Unicode case/digit semantics
+    mask = 0
+    for c in secret:
+        if c.isupper():
+            mask |= CLASS_UPPER
+        if c.islower():
+            mask |= CLASS_LOWER
+        if c.isdigit():
+            mask |= CLASS_DIGIT
+        if c in SPECIAL_CHARACTERS:
+            mask |= CLASS_SPECIAL
+    return mask
+
+
+def _derive_password_key(password: str, salt: bytes, algorithm: str = "pbkdf2_sha256") -> bytes:
+    """Derive the PBKDF2-HMAC-SHA256 (or scrypt) key for a password (OpenSSL-backed via hashlib)"""
+    # Deliberately uncached: every guess must pay the full KDF cost
+    password_bytes = password.encode()
+    if algorithm == "scrypt":
+        return hashlib.scrypt(password_bytes, salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P, dklen=PBKDF2_KEY_LENGTH)
+    return hashlib.pbkdf2_hmac("sha256", password_bytes, salt, PBKDF2_ITERATIONS, dklen=PBKDF2_KEY_LENGTH)
+
 class SecretsManager:
     """Enhanced secrets management with encryption"""
     
+    __slots__ = (
+        "master_key", "cipher_suite", "aead", "secrets_cache", "_cache_lock",
+        "_rand_pool", "_rand_off", "_rand_pid", "_rand_lock"
+    )
+    
+    # ((key_file, mtime_ns, size), key) from the last master key file read
+    _master_key_cache: Optional[Tuple[Tuple[str, int, int], bytes]] = None
+    # master key -> (Fernet, AESGCM); both are stateless per call and safe to share across threads
+    _cipher_cache: Dict[bytes, Tuple[Fernet, AESGCM]] = {}
+    
     def __init__(self):
         self.master_key = self._get_or_create_master_key()
-        self.cipher_suite = Fernet(self.master_key)
-        self.secrets_cache = {}
+        ciphers = SecretsManager._cipher_cache.get(self.master_key)
+        if ciphers is None:
+            # One-shot AES-256-GCM (AES-NI/CLMUL in OpenSSL) under a key derived from the master key
+            aead = AESGCM(HKDF(
+                algorithm=hashes.SHA256(),
+                length=32,
+                salt=None,
+                info=b"secrets-manager aes-256-gcm"
+            ).derive(self.master_key))
+            ciphers = (Fernet(self.master_key), aead)
+            SecretsManager._cipher_cache[self.master_key] = ciphers
+        self.cipher_suite, self.aead = ciphers
+        # key -> (expires_at, utf-8 value); LRU-ordered and guarded by a lock for threadpool
+        # callers. Values are mlocked bytearrays, zeroed and unlocked when they leave the cache
+        # (the str returned to callers and the os.environ copy are not covered).
+        self.secrets_cache: "OrderedDict[str, Tuple[float, bytearray]]" = OrderedDict()
+        self._cache_lock = threading.RLock()
+        # Pre-fetched os.urandom bytes handed out in slices to token generators; each slice
+        # is zeroed once taken so the pool never retains issued token material
+        self._rand_pool = bytearray()
+        self._rand_off = 0
+        self._rand_pid = os.getpid()
+        self._rand_lock = threading.Lock()
     
     def _get_or_create_master_key(self) -> bytes:
         """Get or create master encryption key"""
@@ -31,54 +188,121 @@ class SecretsManager:
             except Exception as e:
                 logger.warning(f"Invalid master key in environment: {e}")
         
-        # Try to get from file
+        # Try to get from file, reusing the key read by an earlier instance if the file is unchanged
         key_file = os.getenv("MASTER_KEY_FILE", ".master_key")
-        if os.path.exists(key_file):
-            try:
-                with open(key_file, 'rb') as f:
-                    return f.read()
-            except Exception as e:
-                logger.warning(f"Error reading master key file: {e}")
+        try:
+            stat = os.stat(key_file)
+            signature = (key_file, stat.st_mtime_ns, stat.st_size)
+            cached = SecretsManager._master_key_cache
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+            
+            with open(key_file, 'rb') as f:
+                key = f.read()
+            SecretsManager._master_key_cache = (signature, key)
+            return key
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Error reading master key file: {e}")
         
         # Generate new master key
         logger.warning("No master key found, generating new one")
         new_key = Fernet.generate_key()
         
-        # Save to file
+        # Save to file atomically: write a private temp file, fsync, then rename into place
+        tmp_path = None
         try:
-            with open(key_file, 'wb') as f:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(key_file) or ".")
+            with os.fdopen(fd, 'wb') as f:
+                os.fchmod(f.fileno(), 0o600)  # Restrict permissions before the key is written
                 f.write(new_key)
-            os.chmod(key_file, 0o600)  # Restrict permissions
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, key_file)
+            tmp_path = None
             logger.info(f"New master key saved to {key_file}")
         except Exception as e:
             logger.error(f"Failed to save master key: {e}")
+        finally:
+            if tmp_path is not None:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
         
         return new_key
     
-    def encrypt_secret(self, secret: str) -> str:
-        """Encrypt a secret value"""
+    def encrypt_secret(self, secret: Union[str, bytes]) -> str:
+        """Encrypt a secret value (str or raw bytes)"""
         try:
-            encrypted_bytes = self.cipher_suite.encrypt(secret.encode())
-            return base64.urlsafe_b64encode(encrypted_bytes).decode()
+            raw = secret if isinstance(secret, bytes) else secret.encode()
+            nonce = os.urandom(AESGCM_NONCE_SIZE)
+            sealed = self.aead.encrypt(nonce, raw, None)
+            return AESGCM_PREFIX + base64.urlsafe_b64encode(nonce + sealed).decode("ascii")
         except Exception as e:
             logger.error(f"Error encrypting secret: {e}")
             raise
     
-    def decrypt_secret(self, encrypted_secret: str) -> str:
-        """Decrypt a secret value"""
+    def decrypt_secret_bytes(self, encrypted_secret: str) -> bytes:
+        """Decrypt a secret value to raw bytes"""
         try:
-            encrypted_bytes = base64.urlsafe_b64decode(encrypted_secret.encode())
-            decrypted_bytes = self.cipher_suite.decrypt(encrypted_bytes)
-            return decrypted_bytes.decode()
+            if encrypted_secret.startswith(AESGCM_PREFIX):
+                # b64decode takes ASCII str directly; memoryview slices avoid copying the blob
+                blob = memoryview(base64.urlsafe_b64decode(encrypted_secret[len(AESGCM_PREFIX):]))
+                return self.aead.decrypt(blob[:AESGCM_NONCE_SIZE], blob[AESGCM_NONCE_SIZE:], None)
+            
+            # Legacy formats: a bare Fernet token (already urlsafe base64), or one
+            # wrapped in an extra base64 layer
+            if encrypted_secret.startswith(FERNET_TOKEN_PREFIX):
+                token = encrypted_secret.encode("ascii")
+            else:
+                token = base64.urlsafe_b64decode(encrypted_secret)
+            return self.cipher_suite.decrypt(token)
         except Exception as e:
             logger.error(f"Error decrypting secret: {e}")
             raise
     
+    def decrypt_secret(self, encrypted_secret: str) -> str:
+        """Decrypt a secret value"""
+        return self.decrypt_secret_bytes(encrypted_secret).decode()
+    
+    def encrypt_secrets(self, values: List[Union[str, bytes]]) -> List[str]:
+        """Encrypt many secrets at once (e.g. for key rotation)"""
+        # One CSPRNG read supplies every nonce; the shared AESGCM context is reused per value
+        nonces = memoryview(os.urandom(AESGCM_NONCE_SIZE * len(values)))
+        encrypt = self.aead.encrypt
+        b64encode = base64.urlsafe_b64encode
+        encrypted = []
+        for i, value in enumerate(values):
+            raw = value if isinstance(value, bytes) else value.encode()
+            nonce = nonces[i * AESGCM_NONCE_SIZE:(i + 1) * AESGCM_NONCE_SIZE]
+            sealed = encrypt(nonce, raw, None)
+            encrypted.append(AESGCM_PREFIX + b64encode(nonce.tobytes() + sealed).decode("ascii"))
+        return encrypted
+    
+    def decrypt_secrets(self, encrypted_values: List[str]) -> List[str]:
+        """Decrypt many secrets at once"""
+        decrypt = self.decrypt_secret_bytes
+        return [decrypt(value).decode() for value in encrypted_values]
+    
+    def reencrypt_secret(self, encrypted_secret: str) -> str:
+        """Migrate a stored ciphertext to the current format (no-op if already current)"""
+        if encrypted_secret.startswith(AESGCM_PREFIX):
+            return encrypted_secret
+        return self.encrypt_secret(self.decrypt_secret_bytes(encrypted_secret))
+    
     def get_secret(self, key: str, default: Optional[str] = None, encrypted: bool = False) -> Optional[str]:
         """Get a secret value with caching"""
         # Check cache first
-        if key in self.secrets_cache:
-            return self.secrets_cache[key]
+        now = time.monotonic()
+        with self._cache_lock:
+            entry = self.secrets_cache.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self.secrets_cache.move_to_end(key)
+                    return entry[1].decode()
+                _wipe(self.secrets_cache.pop(key)[1])
         
         # Get from environment
         value = os.getenv(key, default)
@@ -92,12 +316,26 @@ class SecretsManager:
         
         # Cache the value
         if value:
-            self.secrets_cache[key] = value
+            buffer = bytearray(value.encode())
+            _lock_memory(buffer)
+            with self._cache_lock:
+                previous = self.secrets_cache.pop(key, None)
+                self.secrets_cache[key] = (now + SECRETS_CACHE_TTL, buffer)
+                if len(self.secrets_cache) > SECRETS_CACHE_SIZE:
+                    _wipe(self.secrets_cache.popitem(last=False)[1][1])
+            if previous is not None:
+                _wipe(previous[1])
         
         return value
     
     def set_secret(self, key: str, value: str, encrypt: bool = True) -> str:
         """Set a secret value"""
+        # Drop any cached copy so the next get_secret sees the new value
+        with self._cache_lock:
+            previous = self.secrets_cache.pop(key, None)
+        if previous is not None:
+            _wipe(previous[1])
+        
         if encrypt:
             encrypted_value = self.encrypt_secret(value)
             # Store encrypted value in environment or file
@@ -107,13 +345,35 @@ class SecretsManager:
             os.environ[key] = value
             return value
     
+    def _random_bytes(self, length: int) -> bytes:
+        """Take `length` unused CSPRNG bytes from the pool, refilling it with one syscall"""
+        if length > RANDOM_POOL_SIZE:
+            return os.urandom(length)
+        
+        with self._rand_lock:
+            # A forked worker must never hand out bytes its parent already used
+            pid = os.getpid()
+            if self._rand_pid != pid or self._rand_off + length > len(self._rand_pool):
+                self._rand_pool[:] = os.urandom(RANDOM_POOL_SIZE)
+                self._rand_off = 0
+                self._rand_pid = pid
+            
+            start = self._rand_off
+            end = start + length
+            with memoryview(self._rand_pool) as view:
+                material = bytes(view[start:end])
+            self._rand_pool[start:end] = bytes(length)
+            self._rand_off = end
+            return material
+    
     def generate_secure_token(self, length: int = 32) -> str:
         """Generate a cryptographically secure token"""
-        return secrets.token_urlsafe(length)
+        # Same encoding as secrets.token_urlsafe(length)
+        return base64.urlsafe_b64encode(self._random_bytes(length)).rstrip(b"=").decode("ascii")
     
     def generate_api_key(self, prefix: str = "api") -> str:
         """Generate a secure API key"""
-        random_part = secrets.token_urlsafe(32)
+        random_part = self.generate_secure_token(32)
         return f"{prefix}_{random_part}"
     
     def hash_password(self, password: str, salt: Optional[bytes] = None) -> Dict[str, str]:
@@ -121,14 +381,7 @@ class SecretsManager:
         if salt is None:
             salt = secrets.token_bytes(32)
         
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=100000,
-        )
-        
-        key = base64.urlsafe_b64encode(kdf.derive(password.encode()))
+        key = base64.urlsafe_b64encode(_derive_password_key(password, salt))
         salt_b64 = base64.urlsafe_b64encode(salt).decode()
         
         return {
@@ -136,64 +389,57 @@ class SecretsManager:
             "salt": salt_b64
         }
     
+    def hash_password_scrypt(self, password: str, salt: Optional[bytes] = None) -> Dict[str, str]:
+        """Hash a password with salt using memory-hard scrypt"""
+        if salt is None:
+            salt = secrets.token_bytes(32)
+        
+        key = base64.urlsafe_b64encode(_derive_password_key(password, salt, "scrypt"))
+        salt_b64 = base64.urlsafe_b64encode(salt).decode()
+        
+        return {
+            "hash": SCRYPT_HASH_PREFIX + key.decode(),
+            "salt": salt_b64
+        }
+    
     def verify_password(self, password: str, password_hash: str, salt: str) -> bool:
-        """Verify a password against its hash"""
+        """Verify a password against its hash (scrypt, or legacy PBKDF2)"""
         try:
             salt_bytes = base64.urlsafe_b64decode(salt.encode())
             
-            kdf = PBKDF2HMAC(
-                algorithm=hashes.SHA256(),
-                length=32,
-                salt=salt_bytes,
-                iterations=100000,
-            )
-            
-            key = base64.urlsafe_b64encode(kdf.derive(password.encode()))
-            return key.decode() == password_hash
+            if password_hash.startswith(SCRYPT_HASH_PREFIX):
+                key = SCRYPT_HASH_PREFIX.encode() + base64.urlsafe_b64encode(
+                    _derive_password_key(password, salt_bytes, "scrypt")
+                )
+            else:
+                key = base64.urlsafe_b64encode(_derive_password_key(password, salt_bytes))
+            # Constant-time comparison so response timing leaks nothing about the stored hash
+            return hmac.compare_digest(key, password_hash.encode())
             
         except Exception as e:
             logger.error(f"Error verifying password: {e}")
             return False
     
     def validate_secret_strength(self, secret: str, min_length: int = 8) -> Dict[str, Any]:
-        """Validate secret strength"""
-        result = {
-            "valid": True,
-            "score": 0,
-            "issues": []
-        }
-        
-        if len(secret) < min_length:
-            result["valid"] = False
-            result["issues"].append(f"Password must be at least {min_length} characters")
-        
-        if not any(c.isupper() for c in secret):
-            result["score"] += 1
-            result["issues"].append("Should contain uppercase letters")
-        
-        if not any(c.islower() for c in secret):
-            result["score"] += 1
-            result["issues"].append("Should contain lowercase letters")
+        """Validate secret strength; score is the number of character classes present (0-4)"""
+        classes = _classify_characters(secret)
+        too_short = len(secret) < min_length
+        too_common = secret.lower() in WEAK_PASSWORDS
         
-        if not any(c.isdigit() for c in secret):
-            result["score"] += 1
-            result["issues"].append("Should contain numbers")
+        issues = []
+        if too_short:
+            issues.append(f"Password must be at least {min_length} characters")
+        for class_bit, issue in CHARACTER_CLASS_ISSUES:
+            if not classes & class_bit:
+                issues.append(issue)
+        if too_common:
+            issues.append("Password is too common")
         
-        if not any(c in "!@#$%^&*()_+-=[]{}|;:,.<>?" for c in secret):
-            result["score"] += 1
-            result["issues"].append("Should contain special characters")
-        
-        # Common weak passwords
-        weak_passwords = [
-            "password", "123456", "admin", "qwerty", "letmein",
-            "welcome", "monkey", "dragon", "master", "hello"
-        ]
-        
-        if secret.lower() in weak_passwords:
-            result["valid"] = False
-            result["issues"].append("Password is too common")
-        
-        return result
+        return {
+            "valid": not (too_short or too_common),
+            "score": bin(classes).count("1"),
+            "issues": issues
+        }
 
 # Global secrets manager instance
 secrets_manager = SecretsManager()
@@ -219,6 +465,19 @@ def hash_password(password: str, salt: Optional[bytes] = None) -> Dict[str, str]
     """Hash a password with salt"""
     return secrets_manager.hash_password(password, salt)
 
+def hash_password_scrypt(password: str, salt: Optional[bytes] = None) -> Dict[str, str]:
+    """Hash a password with salt using scrypt"""
+    return secrets_manager.hash_password_scrypt(password, salt)
+
 def verify_password(password: str, password_hash: str, salt: str) -> bool:
     """Verify a password against its hash"""
     return secrets_manager.verify_password(password, password_hash, salt)
+
+async def hash_password_async(password: str, salt: Optional[bytes] = None) -> Dict[str, str]:
+    """Hash a password without blocking the event loop"""
+    # hashlib's KDFs release the GIL, so worker threads derive keys in parallel
+    return await asyncio.to_thread(secrets_manager.hash_password, password, salt)
+
+async def verify_password_async(password: str, password_hash: str, salt: str) -> bool:
+    """Verify a password without blocking the event loop"""
+    return await asyncio.to_thread(secrets_manager.verify_password, password, password_hash, salt)
@@ -10,17 +10,43 @@ from typing import Dict, List, Optional, Any, Tuple, Union
 from datetime import datetime
 import uuid
 import hashlib
+import orjson
+from collections import OrderedDict
 
 import chromadb
 from chromadb.config import Settings
 from chromadb.api.models.Collection import Collection
 from pydantic import BaseModel, Field
 
-from app.core.ai_client import get_ai_service, AIMessage
+from app.config import settings
+from app.core.ai_client import get_ai_service, normalize_embedding, AIMessage
 from app.core.logging import get_logger
 
 logger = get_logger(__name__)
 
+# Metadata value types ChromaDB stores natively
+_SCALAR_METADATA_TYPES = (str, int, float, bool)
+
+
+def _encode_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Coerce metadata values into the scalar types ChromaDB accepts.
+    
+    Scalars pass through untouched; datetimes become ISO-8601 strings and
+    lists/dicts become compact JSON, all through orjson's native encoders.
+    None values are dropped since Chroma rejects them.
+    """
+    encoded = {}
+    for key, value in metadata.items():
+        if value is None:
+            continue
+        if isinstance(value, _SCALAR_METADATA_TYPES):
+            encoded[key] = value
+            continue
+        dumped = orjson.dumps(value, default=str)
+        # A bare JSON string (datetime, date, UUID, ...) is stored without its quotes
+        encoded[key] = orjson.loads(dumped) if dumped[:1] == b'"' else dumped.decode()
+    return encoded
+
 
 class Document(BaseModel):
     """Document model for vector storage."""
@@ -55,13 +81,41 @@ class RAGResponse(BaseModel):
 
 
 class VectorDatabase:
-    """Vector database manager using ChromaDB."""
+    """Vector database manager using ChromaDB.
     
-    def __init__(self, persist_directory: str = "./chroma_db"):
+    ChromaDB's client API is synchronous (SQLite + HNSW), so every call is
+    dispatched through asyncio.to_thread to keep the event loop responsive.
+    """
+    
+    # Maximum embedding requests in flight during bulk ingestion
+    EMBEDDING_CONCURRENCY = 8
+    # Texts per embedding request; bounds server-side memory per call
+    EMBEDDING_BATCH_SIZE = 64
+    # Query embeddings kept for reuse across searches and collections
+    QUERY_EMBEDDING_CACHE_SIZE = 2048
+    # Documents per collection.add call during bulk ingestion
+    ADD_BATCH_SIZE = 128
+    # Collection metadata marking stored embeddings as unit length (as /api/embed returns them)
+    EMBEDDING_NORM_KEY = "embedding_norm"
+    EMBEDDING_NORM = "l2"
+    
+    def __init__(
+        self,
+        persist_directory: str = "./chroma_db",
+        mode: str = "persistent",
+        host: str = "localhost",
+        port: int = 8000
+    ):
         self.persist_directory = persist_directory
+        # "persistent" embeds ChromaDB in-process; "http" talks to a Chroma server
+        self.mode = mode
+        self.host = host
+        self.port = port
         self.client = None
         self.collections: Dict[str, Collection] = {}
         self.logger = get_logger(__name__)
+        # blake2b(query) -> embedding, in LRU order
+        self._query_embedding_cache: "OrderedDict[bytes, List[float]]" = OrderedDict()
         
         # Collection configurations
         self.collection_configs = {
@@ -102,13 +156,25 @@ class VectorDatabase:
     async def initialize(self):
         """Initialize the vector database."""
         try:
-            self.client = chromadb.PersistentClient(
-                path=self.persist_directory,
-                settings=Settings(
-                    anonymized_telemetry=False,
-                    allow_reset=True
-                )
+            chroma_settings = Settings(
+                anonymized_telemetry=False,
+                allow_reset=True
             )
+            if self.mode == "http":
+                # A Chroma server keeps index mutation out of this process
+                self.client = await asyncio.to_thread(
+                    chromadb.HttpClient,
+                    host=self.host,
+                    port=self.port,
+                    settings=chroma_settings
+                )
+            else:
+                # Opening the persistent store reads SQLite and HNSW files; keep it off the event loop
+                self.client = await asyncio.to_thread(
+                    chromadb.PersistentClient,
+                    path=self.persist_directory,
+                    settings=chroma_settings
+                )
             
             # Create collections
             await self._create_collections()
@@ -126,21 +192,57 @@ class VectorDatabase:
             try:
                 # Check if collection exists
                 try:
-                    collection = self.client.get_collection(collection_name)
+                    collection = await asyncio.to_thread(self.client.get_collection, collection_name)
                     self.logger.info(f"Collection '{collection_name}' already exists")
                 except:
                     # Create new collection
-                    collection = self.client.create_collection(
+                    collection = await asyncio.to_thread(
+                        self.client.create_collection,
                         name=collection_name,
-                        metadata={"description": config["description"]}
+                        metadata={
+                            "description": config["description"],
+                            self.EMBEDDING_NORM_KEY: self.EMBEDDING_NORM
+                        }
                     )
                     self.logger.info(f"Created collection '{collection_name}'")
                 
                 self.collections[collection_name] = collection
                 
+                try:
+                    await self._normalize_stored_embeddings(collection)
+                except Exception as e:
+                    # Left unmarked, so the next start retries
+                    self.logger.error(f"Failed to normalize embeddings in '{collection_name}': {e}")
+                
             except Exception as e:
                 self.logger.error(f"Failed to create collection '{collection_name}': {e}")
     
+    async def _normalize_stored_embeddings(self, collection: Collection) -> None:
+        """Rescale embeddings stored before queries switched to unit vectors.
+        
+        /api/embed returns the /api/embeddings vector scaled to unit length, so
+        normalizing the stored vectors in place matches re-embedding them without
+        calling the model. Collections are marked once done and skipped afterwards.
+        """
+        metadata = dict(collection.metadata or {})
+        if metadata.get(self.EMBEDDING_NORM_KEY) == self.EMBEDDING_NORM:
+            return
+        
+        # Snapshot the ids first so updates can't shift pages under an offset
+        ids = (await asyncio.to_thread(collection.get, include=[]))["ids"]
+        size = self.ADD_BATCH_SIZE
+        for i in range(0, len(ids), size):
+            page = await asyncio.to_thread(collection.get, ids=ids[i:i + size], include=["embeddings"])
+            await asyncio.to_thread(
+                collection.update,
+                ids=page["ids"],
+                embeddings=[normalize_embedding(embedding) for embedding in page["embeddings"]]
+            )
+        
+        metadata[self.EMBEDDING_NORM_KEY] = self.EMBEDDING_NORM
+        await asyncio.to_thread(collection.modify, metadata=metadata)
+        self.logger.info(f"Normalized {len(ids)} stored embeddings in '{collection.name}'")
+    
     async def add_document(
         self,
         collection_name: str,
@@ -162,14 +264,15 @@ class VectorDatabase:
                 )
             
             # Prepare metadata
-            metadata = {
-                "created_at": document.created_at.isoformat(),
-                "updated_at": document.updated_at.isoformat(),
+            metadata = _encode_metadata({
+                "created_at": document.created_at,
+                "updated_at": document.updated_at,
                 **document.metadata
-            }
+            })
             
             # Add document to collection
-            collection.add(
+            await asyncio.to_thread(
+                collection.add,
                 documents=[document.content],
                 metadatas=[metadata],
                 embeddings=[document.embedding] if document.embedding else None,
@@ -183,6 +286,27 @@ class VectorDatabase:
             self.logger.error(f"Failed to add document to '{collection_name}': {e}")
             return False
     
+    async def _embed_documents(self, documents: List[Document]) -> None:
+        """Fill in missing document embeddings in batches, keeping a bounded number of requests in flight."""
+        pending = [document for document in documents if not document.embedding]
+        if not pending:
+            return
+        
+        ai_service = await get_ai_service()
+        semaphore = asyncio.Semaphore(self.EMBEDDING_CONCURRENCY)
+        
+        async def embed(batch: List[Document]) -> None:
+            # The client holds the semaphore per HTTP request, including the
+            # one-prompt requests of its /api/embeddings fallback
+            embeddings = await ai_service.ollama_client.generate_embeddings_batch(
+                [document.content for document in batch], semaphore=semaphore
+            )
+            for document, embedding in zip(batch, embeddings):
+                document.embedding = embedding
+        
+        size = self.EMBEDDING_BATCH_SIZE
+        await asyncio.gather(*(embed(pending[i:i + size]) for i in range(0, len(pending), size)))
+    
     async def add_documents(
         self,
         collection_name: str,
@@ -202,30 +326,38 @@ class VectorDatabase:
             doc_embeddings = []
             doc_ids = []
             
+            # Generate missing embeddings concurrently
+            if generate_embeddings:
+                await self._embed_documents(documents)
+            
             for document in documents:
-                # Generate embedding if not provided
-                if generate_embeddings and not document.embedding:
-                    ai_service = await get_ai_service()
-                    document.embedding = await ai_service.ollama_client.generate_embeddings(
-                        document.content
-                    )
-                
                 doc_contents.append(document.content)
-                doc_metadatas.append({
-                    "created_at": document.created_at.isoformat(),
-                    "updated_at": document.updated_at.isoformat(),
+                doc_metadatas.append(_encode_metadata({
+                    "created_at": document.created_at,
+                    "updated_at": document.updated_at,
                     **document.metadata
-                })
+                }))
                 doc_embeddings.append(document.embedding)
                 doc_ids.append(document.id)
             
-            # Add documents to collection
-            collection.add(
-                documents=doc_contents,
-                metadatas=doc_metadatas,
-                embeddings=doc_embeddings,
-                ids=doc_ids
-            )
+            # Add documents to collection in fixed-size slices
+            size = self.ADD_BATCH_SIZE
+            batches = [
+                {
+                    "documents": doc_contents[i:i + size],
+                    "metadatas": doc_metadatas[i:i + size],
+                    "embeddings": doc_embeddings[i:i + size],
+                    "ids": doc_ids[i:i + size]
+                }
+                for i in range(0, len(doc_ids), size)
+            ]
+            if self.mode == "http":
+                # Independent HTTP requests; let the server ingest them in parallel
+                await asyncio.gather(*(asyncio.to_thread(collection.add, **batch) for batch in batches))
+            else:
+                # The embedded store serialises writes to a collection anyway
+                for batch in batches:
+                    await asyncio.to_thread(collection.add, **batch)
             
             self.logger.info(f"Added {len(documents)} documents to collection '{collection_name}'")
             return len(documents)
@@ -246,14 +378,50 @@ class VectorDatabase:
             if collection_name not in self.collections:
                 raise ValueError(f"Collection '{collection_name}' not found")
             
-            collection = self.collections[collection_name]
+            # Generate (or reuse) the query embedding
+            query_embedding = await self.embed_query(query)
             
-            # Generate query embedding
-            ai_service = await get_ai_service()
-            query_embedding = await ai_service.ollama_client.generate_embeddings(query)
+        except Exception as e:
+            self.logger.error(f"Failed to search documents in '{collection_name}': {e}")
+            return []
+        
+        return await self.search_documents_by_embedding(
+            collection_name, query_embedding, top_k, filter_metadata
+        )
+    
+    async def embed_query(self, query: str) -> List[float]:
+        """Embed a query string, reusing recent results from an LRU cache."""
+        key = hashlib.blake2b(query.encode(), digest_size=16).digest()
+        cached = self._query_embedding_cache.get(key)
+        if cached is not None:
+            self._query_embedding_cache.move_to_end(key)
+            return cached
+        
+        ai_service = await get_ai_service()
+        embedding = await ai_service.ollama_client.generate_embeddings(query)
+        
+        self._query_embedding_cache[key] = embedding
+        if len(self._query_embedding_cache) > self.QUERY_EMBEDDING_CACHE_SIZE:
+            self._query_embedding_cache.popitem(last=False)
+        return embedding
+    
+    async def search_documents_by_embedding(
+        self,
+        collection_name: str,
+        query_embedding: List[float],
+        top_k: int = 5,
+        filter_metadata: Optional[Dict[str, Any]] = None
+    ) -> List[QueryResult]:
+        """Search for documents similar to an already computed query embedding."""
+        try:
+            if collection_name not in self.collections:
+                raise ValueError(f"Collection '{collection_name}' not found")
+            
+            collection = self.collections[collection_name]
             
-            # Search for similar documents
-            results = collection.query(
+            # Search for similar documents (off the event loop so searches can overlap)
+            results = await asyncio.to_thread(
+                collection.query,
                 query_embeddings=[query_embedding],
                 n_results=top_k,
                 where=filter_metadata
@@ -302,7 +470,7 @@ class VectorDatabase:
             collection = self.collections[collection_name]
             
             # Get document
-            results = collection.get(ids=[document_id])
+            results = await asyncio.to_thread(collection.get, ids=[document_id])
             
             if results["documents"] and results["documents"][0]:
                 metadata = results["metadatas"][0][0]
@@ -347,11 +515,11 @@ class VectorDatabase:
                 existing_doc.content = content
             
             if metadata is not None:
-                update_data["metadatas"] = [{
-                    "created_at": existing_doc.created_at.isoformat(),
-                    "updated_at": datetime.now().isoformat(),
+                update_data["metadatas"] = [_encode_metadata({
+                    "created_at": existing_doc.created_at,
+                    "updated_at": datetime.now(),
                     **metadata
-                }]
+                })]
                 existing_doc.metadata.update(metadata)
             
             # Regenerate embedding if content changed
@@ -361,7 +529,8 @@ class VectorDatabase:
                 update_data["embeddings"] = [embedding]
             
             # Update document
-            collection.update(
+            await asyncio.to_thread(
+                collection.update,
                 ids=[document_id],
                 **update_data
             )
@@ -382,7 +551,7 @@ class VectorDatabase:
             collection = self.collections[collection_name]
             
             # Delete document
-            collection.delete(ids=[document_id])
+            await asyncio.to_thread(collection.delete, ids=[document_id])
             
             self.logger.info(f"Deleted document {document_id} from collection '{collection_name}'")
             return True
@@ -400,7 +569,7 @@ class VectorDatabase:
             collection = self.collections[collection_name]
             
             # Get collection info
-            count = collection.count()
+            count = await asyncio.to_thread(collection.count)
             
             config = self.collection_configs.get(collection_name, {
                 "description": "",
@@ -424,8 +593,12 @@ class VectorDatabase:
             stats = {}
             total_documents = 0
             
-            for collection_name in self.collections.keys():
-                collection_stats = await self.get_collection_stats(collection_name)
+            # Counts run in worker threads, so fetch them all at once
+            collection_names = list(self.collections.keys())
+            all_stats = await asyncio.gather(*(
+                self.get_collection_stats(collection_name) for collection_name in collection_names
+            ))
+            for collection_name, collection_stats in zip(collection_names, all_stats):
                 stats[collection_name] = collection_stats
                 total_documents += collection_stats.get("document_count", 0)
             
@@ -449,7 +622,7 @@ class VectorDatabase:
             collection = self.collections[collection_name]
             
             # Delete all documents
-            collection.delete()
+            await asyncio.to_thread(collection.delete)
             
             self.logger.info(f"Cleared collection '{collection_name}'")
             return True
@@ -497,15 +670,19 @@ class RAGService:
             if collection_names is None:
                 collection_names = list(self.vector_db.collections.keys())
             
-            # Search for relevant documents
-            all_results = []
-            for collection_name in collection_names:
-                results = await self.vector_db.search_documents(
+            # Embed the query once and reuse it for every collection
+            query_embedding = await self.vector_db.embed_query(query)
+            
+            # Search all collections concurrently
+            results_per_collection = await asyncio.gather(*(
+                self.vector_db.search_documents_by_embedding(
                     collection_name=collection_name,
-                    query=query,
+                    query_embedding=query_embedding,
                     top_k=top_k
                 )
-                all_results.extend(results)
+                for collection_name in collection_names
+            ))
+            all_results = [result for results in results_per_collection for result in results]
             
             # Sort by similarity score and take top results
             all_results.sort(key=lambda x: x.similarity_score, reverse=True)
@@ -600,7 +777,8 @@ class RAGService:
         try:
             # Get documents from collection
             collection = self.vector_db.collections[collection_name]
-            results = collection.get(
+            results = await asyncio.to_thread(
+                collection.get,
                 limit=max_documents,
                 where=filter_metadata
             )
@@ -690,7 +868,12 @@ async def get_vector_db() -> VectorDatabase:
     """Get global vector database instance."""
     global vector_db
     if vector_db is None:
-        vector_db = VectorDatabase()
+        vector_db = VectorDatabase(
+            persist_directory=settings.CHROMA_PERSIST_DIRECTORY,
+            mode=settings.CHROMA_MODE,
+            host=settings.CHROMA_HOST,
+            port=settings.CHROMA_PORT
+        )
         await vector_db.initialize()
     return vector_db
 
@@ -707,6 +890,11 @@ async def get_rag_service() -> RAGService:
 async def initialize_vector_db() -> VectorDatabase:
     """Initialize vector database."""
     global vector_db
-    vector_db = VectorDatabase()
+    vector_db = VectorDatabase(
+        persist_directory=settings.CHROMA_PERSIST_DIRECTORY,
+        mode=settings.CHROMA_MODE,
+        host=settings.CHROMA_HOST,
+        port=settings.CHROMA_PORT
+    )
     await vector_db.initialize()
     return vector_db
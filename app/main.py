@@ -4,7 +4,8 @@ Simplified FastAPI application for GenAI Metrics Dashboard Demo
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import Response
+from fastapi.responses import Response, ORJSONResponse
+import asyncio
 import time
 import logging
 
@@ -12,6 +13,9 @@ from app.config import settings
 from app.api.v1.api import api_router
 from app.routes.views import router as views_router
 from app.websocket.endpoints import router as websocket_router
+from app.core.ollama_client import ollama_client
+from app.core.memory_manager import optimization_service
+from app.database import connection_pool
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -24,7 +28,8 @@ app = FastAPI(
     description="GenAI Metrics Dashboard - Enterprise Project Management Platform",
     openapi_url="/openapi.json",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware - simplified for demo
@@ -453,6 +458,9 @@ async def startup_event():
     logger.info(f"📊 Project: {settings.PROJECT_NAME}")
     logger.info(f"🔢 Version: {settings.VERSION}")
     logger.info(f"🌐 API URL: {settings.API_V1_STR}")
+    await optimization_service.start_optimization()
+    # Sample checked-out connections for pool saturation alerts
+    app.state.pool_monitor_task = asyncio.create_task(connection_pool.monitor_pool(), name="pool-monitor")
     logger.info("✅ API startup complete!")
 
 # Shutdown event
@@ -460,6 +468,12 @@ async def startup_event():
 async def shutdown_event():
     """Application shutdown event"""
     logger.info("🛑 GenAI Metrics Dashboard API shutting down...")
+    pool_monitor_task = getattr(app.state, "pool_monitor_task", None)
+    if pool_monitor_task is not None:
+        pool_monitor_task.cancel()
+        await asyncio.gather(pool_monitor_task, return_exceptions=True)
+    await optimization_service.stop_optimization()
+    await ollama_client.aclose()
     logger.info("✅ API shutdown complete!")
 
 if __name__ == "__main__":
@@ -3,6 +3,7 @@ WebSocket Connection Manager for real-time updates
 """
 import json
 import asyncio
+import orjson
 from typing import Dict, List, Set
 from fastapi import WebSocket, WebSocketDisconnect
 import logging
@@ -75,14 +76,25 @@ class ConnectionManager:
             logger.warning(f"Room '{room}' not found")
             return
         
-        # Send to all active connections in the room
+        await self._broadcast_payload(orjson.dumps(message).decode(), room, exclude)
+    
+    async def broadcast_to_all(self, message: Dict, exclude: WebSocket = None):
+        """Broadcast a message to all active connections"""
+        # Encode once for every room rather than once per room and connection
+        payload = orjson.dumps(message).decode()
+        for room in tuple(self.active_connections):
+            await self._broadcast_payload(payload, room, exclude)
+    
+    async def _broadcast_payload(self, payload: str, room: str, exclude: WebSocket = None):
+        """Send an already-encoded message to all connections in a room"""
         disconnected = set()
-        for websocket in self.active_connections[room]:
+        # Snapshot: connects and disconnects can change the room while a send is awaited
+        for websocket in tuple(self.active_connections[room]):
             if websocket == exclude:
                 continue
                 
             try:
-                await websocket.send_text(json.dumps(message))
+                await websocket.send_text(payload)
             except Exception as e:
                 logger.error(f"Error broadcasting to {websocket.client}: {e}")
                 disconnected.add(websocket)
@@ -91,11 +103,6 @@ class ConnectionManager:
         for websocket in disconnected:
             await self.disconnect(websocket)
     
-    async def broadcast_to_all(self, message: Dict, exclude: WebSocket = None):
-        """Broadcast a message to all active connections"""
-        for room in self.active_connections:
-            await self.broadcast_to_room(message, room, exclude)
-    
     async def _send_queued_messages(self, websocket: WebSocket, room: str):
         """Send queued messages to a newly connected client"""
         if room in self.message_queue and self.message_queue[room]:
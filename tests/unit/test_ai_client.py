@@ -0,0 +1,104 @@
+"""
+Unit tests for the Ollama embeddings client
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.core.ai_client import OllamaClient, normalize_embedding
+
+
+def _client_with_handler(handler):
+    """OllamaClient whose HTTP calls are answered by handler."""
+    client = OllamaClient()
+    client.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+@pytest.mark.unit
+class TestOllamaEmbeddings:
+    """Test batch embeddings and the /api/embeddings fallback."""
+
+    @pytest.mark.asyncio
+    async def test_generate_embeddings_batch_uses_embed_endpoint(self):
+        paths = []
+
+        def handler(request):
+            paths.append(request.url.path)
+            texts = json.loads(request.content)["input"]
+            return httpx.Response(200, json={"embeddings": [[float(len(text))] for text in texts]})
+
+        client = _client_with_handler(handler)
+
+        assert await client.generate_embeddings_batch(["a", "bb"]) == [[1.0], [2.0]]
+        assert await client.generate_embeddings("ccc") == [3.0]
+        assert paths == ["/api/embed", "/api/embed"]
+
+    @pytest.mark.asyncio
+    async def test_generate_embeddings_falls_back_without_embed_endpoint(self):
+        paths = []
+
+        def handler(request):
+            paths.append(request.url.path)
+            if request.url.path == "/api/embed":
+                return httpx.Response(404, text="404 page not found")
+            prompt = json.loads(request.content)["prompt"]
+            return httpx.Response(200, json={"embedding": [3.0 * len(prompt), 4.0 * len(prompt)]})
+
+        client = _client_with_handler(handler)
+
+        # /api/embeddings vectors are scaled to unit length like /api/embed results
+        assert await client.generate_embeddings("ccc") == pytest.approx([0.6, 0.8])
+        assert await client.generate_embeddings_batch(["a", "bb"]) == [pytest.approx([0.6, 0.8])] * 2
+        assert paths == ["/api/embed", "/api/embeddings", "/api/embeddings", "/api/embeddings"]
+        assert client.batch_embeddings_supported is False
+
+    @pytest.mark.asyncio
+    async def test_generate_embeddings_unknown_model_keeps_embed_endpoint(self):
+        def handler(request):
+            return httpx.Response(404, json={"error": "model not found"})
+
+        client = _client_with_handler(handler)
+
+        with pytest.raises(Exception, match="HTTP 404"):
+            await client.generate_embeddings("text", model="missing")
+        assert client.batch_embeddings_supported is True
+
+    @pytest.mark.asyncio
+    async def test_generate_embeddings_fallback_requests_share_semaphore(self):
+        in_flight = 0
+        peak = 0
+
+        async def handler(request):
+            nonlocal in_flight, peak
+            if request.url.path == "/api/embed":
+                return httpx.Response(404, text="404 page not found")
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return httpx.Response(200, json={"embedding": [1.0]})
+
+        client = _client_with_handler(handler)
+        semaphore = asyncio.Semaphore(3)
+
+        batches = [[f"text-{batch}-{i}" for i in range(10)] for batch in range(4)]
+        await asyncio.gather(*(
+            client.generate_embeddings_batch(batch, semaphore=semaphore) for batch in batches
+        ))
+
+        assert peak == 3
+
+
+@pytest.mark.unit
+class TestNormalizeEmbedding:
+    """Test unit-length scaling of embeddings."""
+
+    def test_normalize_embedding_scales_to_unit_length(self):
+        assert normalize_embedding([3.0, 4.0]) == pytest.approx([0.6, 0.8])
+
+    def test_normalize_embedding_keeps_zero_vector(self):
+        assert normalize_embedding([0.0, 0.0]) == [0.0, 0.0]
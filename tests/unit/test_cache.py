@@ -0,0 +1,119 @@
+"""
+Unit tests for cache key derivation and value serialization
+"""
+
+import os
+import subprocess
+import sys
+from dataclasses import dataclass
+
+import pytest
+from pydantic import BaseModel
+
+from app.core.cache import RedisCache, _default_cache_key
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class _Client:
+    """Object with no value semantics, like an API client."""
+
+    async def fetch(self, item_id):
+        return item_id
+
+
+class _Query(BaseModel):
+    status: str
+    page: int
+
+
+@dataclass(frozen=True)
+class _Filters:
+    status: str
+    page: int
+
+
+async def _lookup(item_id, verbose=False):
+    return item_id
+
+
+@pytest.mark.unit
+class TestDefaultCacheKey:
+    """Test the default cache_result key."""
+
+    def test_default_cache_key_same_arguments_same_key(self):
+        assert _default_cache_key(_lookup, (1,), {"verbose": True}) == _default_cache_key(_lookup, (1,), {"verbose": True})
+
+    def test_default_cache_key_kwargs_order_does_not_matter(self):
+        key = _default_cache_key(_lookup, (), {"item_id": 1, "verbose": True})
+        assert key == _default_cache_key(_lookup, (), {"verbose": True, "item_id": 1})
+
+    def test_default_cache_key_differs_by_argument_value_and_type(self):
+        assert _default_cache_key(_lookup, (1,), {}) != _default_cache_key(_lookup, (2,), {})
+        assert _default_cache_key(_lookup, (1,), {}) != _default_cache_key(_lookup, ("1",), {})
+        assert _default_cache_key(_lookup, (1,), {}) != _default_cache_key(_lookup, (True,), {})
+        assert _default_cache_key(_lookup, ([1, 2],), {}) != _default_cache_key(_lookup, ((1, 2),), {})
+
+    def test_default_cache_key_differs_by_function(self):
+        assert _default_cache_key(_lookup, (1,), {}) != _default_cache_key(_Client.fetch, (1,), {})
+
+    def test_default_cache_key_keys_models_by_content(self):
+        # Build and drop each model so the second can reuse the first one's id()
+        first = _default_cache_key(_lookup, (_Query(status="open", page=1),), {})
+        second = _default_cache_key(_lookup, (_Query(status="open", page=2),), {})
+
+        assert first != second
+        assert first == _default_cache_key(_lookup, (_Query(status="open", page=1),), {})
+        assert _default_cache_key(_lookup, (_Filters("open", 1),), {}) == _default_cache_key(_lookup, (_Filters("open", 1),), {})
+        assert _default_cache_key(_lookup, (_Filters("open", 1),), {}) != _default_cache_key(_lookup, (_Filters("open", 2),), {})
+
+    def test_default_cache_key_nested_containers_key_by_content(self):
+        key = _default_cache_key(_lookup, ({"tags": ["a", "b"], "ids": {3, 1, 2}},), {})
+
+        assert key == _default_cache_key(_lookup, ({"ids": {1, 2, 3}, "tags": ["a", "b"]},), {})
+        assert key != _default_cache_key(_lookup, ({"tags": ["b", "a"], "ids": {1, 2, 3}},), {})
+
+    def test_default_cache_key_rejects_objects_without_value_semantics(self):
+        with pytest.raises(TypeError, match="key_func"):
+            _default_cache_key(_Client.fetch, (_Client(), 1), {})
+
+    def test_default_cache_key_is_stable_across_hash_seeds(self):
+        script = (
+            "from app.core.cache import _default_cache_key\n"
+            "def f(): pass\n"
+            "print(_default_cache_key(f, (frozenset({'a', 'b', 'c'}), {'x': {'y', 'z'}}), {}))"
+        )
+        keys = {
+            subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True,
+                           env={"PYTHONHASHSEED": seed, "PYTHONPATH": REPO_ROOT}).stdout.strip()
+            for seed in ("1", "2", "3")
+        }
+        assert len(keys) == 1
+
+
+@pytest.mark.unit
+class TestCacheSerialization:
+    """Test type-tagged cache value serialization."""
+
+    @pytest.fixture
+    def cache(self):
+        return RedisCache()
+
+    @pytest.mark.parametrize("value", ["plain text", "", "J{not json", 0, -42, 10**20])
+    def test_serialize_scalars_round_trip_with_tag(self, cache, value):
+        serialized = cache._serialize_data(value)
+
+        assert serialized[:1] == ("S" if isinstance(value, str) else "I")
+        assert cache._deserialize_data(serialized) == value
+        assert type(cache._deserialize_data(serialized)) is type(value)
+
+    @pytest.mark.parametrize("value", [{"a": [1, 2]}, [1, "x"], True, None, 1.5])
+    def test_serialize_other_values_use_json(self, cache, value):
+        serialized = cache._serialize_data(value)
+
+        assert serialized[:1] == "J"
+        assert cache._deserialize_data(serialized) == value
+
+    @pytest.mark.parametrize("legacy, value", [('{"a": 1}', {"a": 1}), ("[1, 2]", [1, 2]), ("5", 5), ('"text"', "text")])
+    def test_deserialize_untagged_legacy_entries(self, cache, legacy, value):
+        assert cache._deserialize_data(legacy) == value
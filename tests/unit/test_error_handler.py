@@ -0,0 +1,84 @@
+"""
+Unit tests for ErrorMonitor ring-buffer counters
+"""
+
+import time
+
+import pytest
+
+from app.core.error_handler import ErrorMonitor
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.time(), starting at the beginning of a minute."""
+    now = [1_700_000_040.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def monitor(monkeypatch):
+    """ErrorMonitor that records alerts instead of logging them."""
+    error_monitor = ErrorMonitor()
+    error_monitor.alerts = []
+    monkeypatch.setattr(error_monitor, "send_alert",
+                        lambda code, count, request_id: error_monitor.alerts.append((code, count)))
+    return error_monitor
+
+
+@pytest.mark.unit
+class TestErrorMonitor:
+    """Test per-minute error counters and alert thresholds."""
+
+    def test_track_error_counts_current_minute(self, clock, monitor):
+        monitor.track_error("DB_001", "req-1")
+        monitor.track_error("DB_001", "req-2")
+        monitor.track_error("VAL_001", "req-3")
+
+        stats = monitor.get_error_stats()
+        assert stats["current_minute"] == {"DB_001": 2, "VAL_001": 1}
+        assert stats["total_errors"] == 3
+
+    def test_track_error_alerts_from_threshold_on(self, clock, monitor):
+        for i in range(6):
+            monitor.track_error("DB_001", f"req-{i}")
+
+        assert monitor.alerts == [("DB_001", 5), ("DB_001", 6)]
+
+    def test_track_error_untracked_code_never_alerts(self, clock, monitor):
+        for i in range(20):
+            monitor.track_error("VAL_001", f"req-{i}")
+
+        assert monitor.alerts == []
+
+    def test_track_error_threshold_counts_reset_each_minute(self, clock, monitor):
+        for i in range(4):
+            monitor.track_error("DB_001", f"req-{i}")
+        clock[0] += 60
+        for i in range(4):
+            monitor.track_error("DB_001", f"req-{i}")
+
+        assert monitor.alerts == []
+        stats = monitor.get_error_stats()
+        assert stats["current_minute"] == {"DB_001": 4}
+        assert stats["total_errors"] == 8
+
+    def test_get_error_stats_drops_buckets_outside_window(self, clock, monitor):
+        monitor.track_error("SYS_001", "req-1")
+        clock[0] += 60 * (ErrorMonitor.WINDOW_MINUTES - 1)
+        assert monitor.get_error_stats()["total_errors"] == 1
+
+        clock[0] += 60
+        stats = monitor.get_error_stats()
+        assert stats["total_errors"] == 0
+        assert stats["current_minute"] == {}
+
+    def test_track_error_reuses_slot_after_window_wraps(self, clock, monitor):
+        monitor.track_error("SYS_001", "req-1")
+        clock[0] += 60 * ErrorMonitor.WINDOW_MINUTES
+        monitor.track_error("EXT_001", "req-2")
+
+        stats = monitor.get_error_stats()
+        assert stats["current_minute"] == {"EXT_001": 1}
+        assert stats["total_errors"] == 1
@@ -0,0 +1,43 @@
+"""
+Unit tests for the buffered rotating log file handler
+"""
+
+import logging
+import os
+
+import pytest
+
+from app.core.logging import _BufferedRotatingFileHandler
+
+
+@pytest.mark.unit
+class TestBufferedRotatingFileHandler:
+    """Test size-based rotation of buffered log files."""
+
+    def test_emit_rotates_on_encoded_size(self, tmp_path):
+        log_file = tmp_path / "app.log"
+        handler = _BufferedRotatingFileHandler(str(log_file), maxBytes=100, backupCount=20)
+        handler.encoding = "utf-8"
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        record = logging.LogRecord("test", logging.INFO, __file__, 1, "🚀" * 10, None, None)
+
+        for _ in range(9):
+            handler.emit(record)
+        handler.close()
+
+        files = [log_file] + [tmp_path / f"app.log.{i}" for i in range(1, 21)]
+        sizes = [os.path.getsize(path) for path in files if path.exists()]
+        assert sum(sizes) == 9 * 41
+        assert max(sizes) <= 100
+
+    def test_first_record_rotates_existing_full_file(self, tmp_path):
+        log_file = tmp_path / "app.log"
+        log_file.write_bytes(b"x" * 95)
+        handler = _BufferedRotatingFileHandler(str(log_file), maxBytes=100, backupCount=1)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+
+        handler.emit(logging.LogRecord("test", logging.INFO, __file__, 1, "first record", None, None))
+        handler.close()
+
+        assert os.path.getsize(tmp_path / "app.log.1") == 95
+        assert log_file.read_text() == "first record\n"
@@ -0,0 +1,238 @@
+"""
+Unit tests for memory management and WebSocket connection bookkeeping
+"""
+
+import asyncio
+import gc
+import time
+
+import pytest
+
+from app.core.memory_manager import (
+    MemoryMonitor, MemoryOptimizationService, ResourceManager, WebSocketConnectionManager
+)
+import app.core.memory_manager as memory_manager
+
+
+@pytest.fixture
+def fresh_memory_monitor(monkeypatch):
+    """Replace the global memory monitor with an empty one."""
+    monitor = MemoryMonitor()
+    monkeypatch.setattr(memory_manager, "memory_monitor", monitor)
+    return monitor
+
+
+@pytest.mark.unit
+class TestMemoryOptimizationService:
+    """Test memory checks driven by full collections and by the timer."""
+
+    @pytest.mark.asyncio
+    async def test_full_gc_queues_one_memory_check(self, fresh_memory_monitor):
+        service = MemoryOptimizationService()
+        service._loop = asyncio.get_running_loop()
+
+        service._gc_callback("stop", {"generation": 2})
+        service._gc_callback("stop", {"generation": 2})
+        service._gc_callback("stop", {"generation": 0})
+        await asyncio.sleep(0)
+
+        assert len(fresh_memory_monitor.memory_history) == 1
+        assert fresh_memory_monitor.memory_history[0]["context"] == "full_gc"
+        assert service._gc_check_pending is False
+
+    @pytest.mark.asyncio
+    async def test_periodic_memory_check_fills_history(self, fresh_memory_monitor):
+        service = MemoryOptimizationService()
+
+        await service._periodic_memory_check()
+
+        assert fresh_memory_monitor.get_memory_summary()["history_count"] == 1
+        assert fresh_memory_monitor.peak_memory > 0
+
+    @pytest.mark.asyncio
+    async def test_memory_check_forces_gc_at_most_once_per_interval(self, fresh_memory_monitor, monkeypatch):
+        service = MemoryOptimizationService()
+        fresh_memory_monitor.cleanup_threshold = 0
+        collections = []
+        monkeypatch.setattr(fresh_memory_monitor, "force_garbage_collection", lambda: collections.append(1))
+
+        await service._periodic_memory_check()
+        await service._periodic_memory_check()
+
+        assert len(collections) == 1
+        assert fresh_memory_monitor._last_forced_gc > 0
+
+    @pytest.mark.asyncio
+    async def test_memory_check_skips_gc_under_threshold(self, fresh_memory_monitor, monkeypatch):
+        service = MemoryOptimizationService()
+        fresh_memory_monitor.cleanup_threshold = float("inf")
+        collections = []
+        monkeypatch.setattr(fresh_memory_monitor, "force_garbage_collection", lambda: collections.append(1))
+
+        await service._periodic_memory_check()
+
+        assert collections == []
+
+    @pytest.mark.asyncio
+    async def test_start_and_stop_restore_gc_state(self):
+        service = MemoryOptimizationService()
+        original_threshold = gc.get_threshold()
+
+        await service.start_optimization()
+        assert gc.get_threshold()[0] >= MemoryOptimizationService.GC_GEN0_THRESHOLD
+        assert service._gc_callback in gc.callbacks
+        await service.stop_optimization()
+
+        assert gc.get_threshold() == original_threshold
+        assert service._gc_callback not in gc.callbacks
+        assert gc.get_freeze_count() == 0
+
+
+class _Resource:
+    """Weakly referenceable stand-in for a managed resource."""
+
+
+@pytest.mark.unit
+class TestResourceManager:
+    """Test weak resource tracking and cleanup callbacks."""
+
+    def test_unregister_resource_runs_cleanup_callback(self):
+        manager = ResourceManager()
+        resource = _Resource()
+        cleaned = []
+        manager.register_resource("r1", resource, cleaned.append)
+
+        manager.unregister_resource("r1")
+
+        assert cleaned == [resource]
+        assert manager.get_resource_stats()["total_resources"] == 0
+
+    def test_collected_resource_is_forgotten_without_callback(self):
+        manager = ResourceManager()
+        cleaned = []
+        manager.register_resource("r1", _Resource(), cleaned.append)
+        gc.collect()
+
+        assert cleaned == []
+        assert "r1" not in manager.resources
+        assert manager.get_resource_stats()["resources_by_age"]["recent"] == 0
+
+    def test_unweakrefable_resource_is_held_strongly(self):
+        manager = ResourceManager()
+        manager.register_resource("r1", {"key": "value"})
+        gc.collect()
+
+        assert manager.get_resource_stats()["total_resources"] == 1
+
+
+class _FakeWebSocket:
+    """WebSocket stand-in recording sent text and close calls."""
+
+    def __init__(self, fail_send=False):
+        self.sent = []
+        self.closed = False
+        self.fail_send = fail_send
+
+    async def send_text(self, payload):
+        if self.fail_send:
+            raise RuntimeError("socket gone")
+        self.sent.append(payload)
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.mark.unit
+class TestWebSocketConnectionIndex:
+    """Test the per-user connection index."""
+
+    @pytest.mark.asyncio
+    async def test_add_connection_enforces_per_user_limit(self):
+        manager = WebSocketConnectionManager()
+        for i in range(manager.connection_limits["per_user"]):
+            assert await manager.add_connection(f"c{i}", _FakeWebSocket(), user_id="alice")
+
+        assert await manager.add_connection("extra", _FakeWebSocket(), user_id="alice") is False
+        assert await manager.add_connection("other", _FakeWebSocket(), user_id="bob") is True
+        assert manager.get_connection_stats()["connections_by_user"] == {"alice": 5, "bob": 1}
+
+    @pytest.mark.asyncio
+    async def test_remove_connection_updates_index(self):
+        manager = WebSocketConnectionManager()
+        websocket = _FakeWebSocket()
+        await manager.add_connection("c1", websocket, user_id="alice", room="r1")
+        await manager.add_connection("c2", _FakeWebSocket(), user_id="alice")
+
+        await manager.remove_connection("c1")
+        assert manager.user_connections["alice"] == {"c2"}
+        assert manager.rooms["r1"] == set()
+        assert websocket.closed is True
+
+        await manager.remove_connection("c2")
+        assert "alice" not in manager.user_connections
+        assert manager.connection_stats["active_connections"] == 0
+
+    @pytest.mark.asyncio
+    async def test_broadcast_to_room_drops_failed_sockets(self):
+        manager = WebSocketConnectionManager()
+        healthy, broken = _FakeWebSocket(), _FakeWebSocket(fail_send=True)
+        await manager.add_connection("c1", healthy, room="r1")
+        await manager.add_connection("c2", broken, room="r1")
+
+        await manager.broadcast_to_room("r1", {"type": "update"})
+
+        assert healthy.sent == ['{"type":"update"}']
+        assert manager.rooms["r1"] == {"c1"}
+        assert manager.connections["c1"].message_count == 1
+
+
+@pytest.mark.unit
+class TestWebSocketActivityHeap:
+    """Test heap-ordered cleanup of inactive connections."""
+
+    @pytest.fixture
+    def clock(self, monkeypatch):
+        now = [1_700_000_000.0]
+        monkeypatch.setattr(time, "time", lambda: now[0])
+        return now
+
+    @pytest.mark.asyncio
+    async def test_cleanup_removes_only_inactive_connections(self, clock):
+        manager = WebSocketConnectionManager()
+        await manager.add_connection("idle", _FakeWebSocket())
+        await manager.add_connection("busy", _FakeWebSocket())
+
+        clock[0] += 500
+        await manager.update_activity("busy")
+        clock[0] += 200
+        await manager.cleanup_inactive_connections()
+
+        assert set(manager.connections) == {"busy"}
+        assert manager.connection_stats["cleaned_connections"] == 1
+        # The active connection was re-queued at its latest activity time
+        assert manager._activity_heap == [(clock[0] - 200, "busy")]
+
+    @pytest.mark.asyncio
+    async def test_cleanup_ignores_stale_entries_for_reused_ids(self, clock):
+        manager = WebSocketConnectionManager()
+        await manager.add_connection("c1", _FakeWebSocket())
+        await manager.remove_connection("c1")
+
+        clock[0] += 500
+        await manager.add_connection("c1", _FakeWebSocket())
+        clock[0] += 200
+        await manager.cleanup_inactive_connections()
+
+        assert "c1" in manager.connections
+        assert manager.connection_stats["cleaned_connections"] == 0
+
+    @pytest.mark.asyncio
+    async def test_cleanup_skips_when_run_recently(self, clock):
+        manager = WebSocketConnectionManager()
+        await manager.add_connection("idle", _FakeWebSocket())
+        manager.last_cleanup = clock[0] + 700
+
+        clock[0] += 700
+        await manager.cleanup_inactive_connections()
+
+        assert "idle" in manager.connections
@@ -0,0 +1,69 @@
+"""
+Unit tests for API performance helpers
+"""
+
+import asyncio
+
+import pytest
+
+from app.core.performance import APIOptimizer, PerformanceOptimizer
+
+
+@pytest.mark.unit
+class TestBatchApiCalls:
+    """Test bounded concurrent API calls."""
+
+    @pytest.mark.asyncio
+    async def test_batch_api_calls_keeps_request_order(self):
+        async def process_request(request):
+            await asyncio.sleep(0.01 * (5 - request["id"]))
+            return request["id"]
+
+        requests = [{"id": i} for i in range(5)]
+        assert await APIOptimizer.batch_api_calls(requests, 10, process_request) == [0, 1, 2, 3, 4]
+
+    @pytest.mark.asyncio
+    async def test_batch_api_calls_caps_calls_in_flight(self):
+        in_flight = 0
+        peak = 0
+
+        async def process_request(request):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0)
+            in_flight -= 1
+            return request
+
+        await APIOptimizer.batch_api_calls([{}] * 20, batch_size=3, process_request=process_request)
+        assert peak == 3
+
+
+@pytest.mark.unit
+class TestCacheResult:
+    """Test the in-process result cache."""
+
+    def test_equal_values_of_different_types_are_cached_separately(self):
+        @PerformanceOptimizer().cache_result()
+        def describe(value, *, suffix=""):
+            return f"{type(value).__name__}:{value!r}{suffix}"
+
+        assert describe(1) == "int:1"
+        assert describe(1.0) == "float:1.0"
+        assert describe(True) == "bool:True"
+        assert describe(1, suffix=1) == "int:11"
+        assert describe(1, suffix=1.0) == "int:11.0"
+        assert describe(1) == "int:1"
+        assert describe.cache_info().hits == 1
+
+    def test_unhashable_arguments_call_through(self):
+        calls = []
+
+        @PerformanceOptimizer().cache_result()
+        def total(values):
+            calls.append(values)
+            return sum(values)
+
+        assert total([1, 2]) == 3
+        assert total([1, 2]) == 3
+        assert len(calls) == 2
@@ -0,0 +1,206 @@
+"""
+Unit tests for PaginatedQuery
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy import Column, ForeignKey, Integer, String, create_engine, text
+from sqlalchemy.orm import declarative_base, joinedload, relationship, sessionmaker
+
+from app.core.performance import PerformanceMonitor
+from app.core.query_optimizer import (
+    DatabaseConnectionPool, PaginatedQuery, QueryPerformanceMonitor, instrument_engine
+)
+import app.core.query_optimizer as query_optimizer
+
+PaginationBase = declarative_base()
+
+
+class Parent(PaginationBase):
+    __tablename__ = "pagination_parents"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50))
+    children = relationship("Child")
+
+
+class Child(PaginationBase):
+    __tablename__ = "pagination_children"
+
+    id = Column(Integer, primary_key=True)
+    parent_id = Column(Integer, ForeignKey("pagination_parents.id"))
+
+
+@pytest.fixture
+def pagination_session():
+    """In-memory database with 25 parents, each with two children."""
+    engine = create_engine("sqlite://")
+    PaginationBase.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    for i in range(1, 26):
+        session.add(Parent(id=i, name=f"parent-{i}", children=[Child(), Child()]))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.mark.unit
+class TestPaginatedQuery:
+    """Test the window-count pagination path."""
+
+    @pytest.mark.asyncio
+    async def test_get_paginated_result_entities_carry_total(self, pagination_session):
+        query = pagination_session.query(Parent).order_by(Parent.id)
+        result = await PaginatedQuery(query, page=2, per_page=10).get_paginated_result(pagination_session)
+
+        assert [parent.id for parent in result["data"]] == list(range(11, 21))
+        assert result["pagination"]["total"] == 25
+        assert result["pagination"]["pages"] == 3
+        assert result["pagination"]["has_next"] is True
+        assert result["pagination"]["prev_page"] == 1
+
+    @pytest.mark.asyncio
+    async def test_get_paginated_result_joined_collection_is_deduplicated(self, pagination_session):
+        query = pagination_session.query(Parent).options(joinedload(Parent.children)).order_by(Parent.id)
+        result = await PaginatedQuery(query, page=1, per_page=10).get_paginated_result(pagination_session)
+
+        assert [parent.id for parent in result["data"]] == list(range(1, 11))
+        assert all(len(parent.children) == 2 for parent in result["data"])
+        assert result["pagination"]["total"] == 25
+
+    @pytest.mark.asyncio
+    async def test_get_paginated_result_columns_keep_named_access(self, pagination_session):
+        query = pagination_session.query(Parent.id, Parent.name).order_by(Parent.id)
+        result = await PaginatedQuery(query, page=1, per_page=5).get_paginated_result(pagination_session)
+
+        first = result["data"][0]
+        ids = await PaginatedQuery(pagination_session.query(Parent.id).order_by(Parent.id), page=1, per_page=5)\
+            .get_paginated_result(pagination_session)
+        assert [row.id for row in ids["data"]] == [1, 2, 3, 4, 5]
+        assert (first.id, first.name) == (1, "parent-1")
+        assert len(first) == 2
+
+    @pytest.mark.asyncio
+    async def test_get_paginated_result_keeps_duplicate_column_rows(self, pagination_session):
+        query = pagination_session.query(Child.parent_id).order_by(Child.parent_id)
+        result = await PaginatedQuery(query, page=1, per_page=10).get_paginated_result(pagination_session)
+
+        assert [row.parent_id for row in result["data"]] == [1, 1, 2, 2, 3, 3, 4, 4, 5, 5]
+        assert result["data"] == query.limit(10).all()
+        assert result["pagination"]["total"] == 50
+
+    @pytest.mark.asyncio
+    async def test_get_paginated_result_dedupes_entities_like_query_all(self, pagination_session):
+        query = pagination_session.query(Parent).join(Parent.children).order_by(Parent.id)
+        result = await PaginatedQuery(query, page=1, per_page=10).get_paginated_result(pagination_session)
+
+        assert result["data"] == query.limit(10).all()
+        assert [parent.id for parent in result["data"]] == [1, 2, 3, 4, 5]
+
+    @pytest.mark.asyncio
+    async def test_get_paginated_result_past_last_page_counts_separately(self, pagination_session):
+        query = pagination_session.query(Parent).order_by(Parent.id)
+        result = await PaginatedQuery(query, page=5, per_page=10).get_paginated_result(pagination_session)
+
+        assert result["data"] == []
+        assert result["pagination"]["total"] == 25
+        assert result["pagination"]["has_next"] is False
+
+    @pytest.mark.asyncio
+    async def test_get_paginated_result_distinct_counts_unique_rows(self, pagination_session):
+        query = pagination_session.query(Child.parent_id).distinct().order_by(Child.parent_id)
+        result = await PaginatedQuery(query, page=1, per_page=10).get_paginated_result(pagination_session)
+
+        assert [row.parent_id for row in result["data"]] == list(range(1, 11))
+        assert result["pagination"]["total"] == 25
+
+
+@pytest.fixture
+def fresh_query_monitor(monkeypatch):
+    """Replace the global query monitor with an empty one."""
+    monitor = QueryPerformanceMonitor()
+    monkeypatch.setattr(query_optimizer, "query_monitor", monitor)
+    return monitor
+
+
+@pytest.mark.unit
+class TestInstrumentEngine:
+    """Test query timing through engine cursor events."""
+
+    def test_instrument_engine_records_statements(self, fresh_query_monitor):
+        engine = create_engine("sqlite://")
+        instrument_engine(engine)
+
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+            connection.execute(text("SELECT 1"))
+
+        summary = fresh_query_monitor.get_performance_summary()
+        assert summary["total_queries"] == 2
+        (stats,) = summary["queries"].values()
+        assert stats["count"] == 2
+        assert stats["statement"] == "SELECT 1"
+
+    @pytest.mark.asyncio
+    async def test_instrument_engine_accepts_async_engine(self, fresh_query_monitor):
+        pytest.importorskip("aiosqlite")
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        engine = create_async_engine("sqlite+aiosqlite://")
+        instrument_engine(engine)
+
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+        await engine.dispose()
+
+        assert fresh_query_monitor.get_performance_summary()["total_queries"] == 1
+
+
+@pytest.mark.unit
+class TestDatabaseConnectionPool:
+    """Test pool saturation sampling and alerts."""
+
+    @pytest.fixture
+    def fresh_performance_monitor(self, monkeypatch):
+        monitor = PerformanceMonitor()
+        monkeypatch.setattr(query_optimizer, "performance_monitor", monitor)
+        return monitor
+
+    @pytest.fixture
+    def pool(self, tmp_path):
+        engine = DatabaseConnectionPool.create_optimized_engine(
+            f"sqlite:///{tmp_path / 'pool.db'}", pool_size=2, max_overflow=2
+        )
+        yield DatabaseConnectionPool(engine)
+        engine.dispose()
+
+    async def _sample_once(self, pool):
+        task = asyncio.create_task(pool.monitor_pool(interval=60))
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    @pytest.mark.asyncio
+    async def test_monitor_pool_alerts_near_capacity(self, pool, fresh_performance_monitor):
+        assert pool.get_pool_capacity() == 4
+        connections = [pool.engine.connect() for _ in range(4)]
+        try:
+            await self._sample_once(pool)
+        finally:
+            for connection in connections:
+                connection.close()
+
+        assert fresh_performance_monitor.alert_thresholds["pool_checked_out"] == pytest.approx(3.6)
+        assert [alert["type"] for alert in fresh_performance_monitor.check_alerts()] == ["pool_checked_out_high"]
+
+    @pytest.mark.asyncio
+    async def test_monitor_pool_quiet_below_threshold(self, pool, fresh_performance_monitor):
+        connection = pool.engine.connect()
+        try:
+            await self._sample_once(pool)
+        finally:
+            connection.close()
+
+        assert fresh_performance_monitor.check_alerts() == []
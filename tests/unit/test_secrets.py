@@ -0,0 +1,116 @@
+"""
+Unit tests for secret encryption and password hashing
+"""
+
+import base64
+
+import pytest
+from cryptography.fernet import Fernet
+
+from app.core.secrets import AESGCM_PREFIX, RANDOM_POOL_SIZE, SCRYPT_HASH_PREFIX, SecretsManager
+
+
+@pytest.fixture
+def fernet_key():
+    return Fernet.generate_key()
+
+
+@pytest.fixture
+def manager(monkeypatch, fernet_key):
+    """SecretsManager keyed from the environment rather than the .master_key file."""
+    monkeypatch.setenv("MASTER_ENCRYPTION_KEY", base64.urlsafe_b64encode(fernet_key).decode())
+    return SecretsManager()
+
+
+@pytest.mark.unit
+class TestSecretEncryption:
+    """Test the AES-GCM "v2:" format and legacy Fernet ciphertexts."""
+
+    def test_encrypt_secret_round_trips_with_v2_prefix(self, manager):
+        encrypted = manager.encrypt_secret("db-password-✓")
+
+        assert encrypted.startswith(AESGCM_PREFIX)
+        assert manager.decrypt_secret(encrypted) == "db-password-✓"
+        assert manager.decrypt_secret_bytes(manager.encrypt_secret(b"\x00\xff")) == b"\x00\xff"
+
+    def test_encrypt_secret_uses_fresh_nonce(self, manager):
+        assert manager.encrypt_secret("same") != manager.encrypt_secret("same")
+
+    def test_decrypt_secret_rejects_tampered_ciphertext(self, manager):
+        blob = bytearray(base64.urlsafe_b64decode(manager.encrypt_secret("value")[len(AESGCM_PREFIX):]))
+        blob[-1] ^= 1
+        tampered = AESGCM_PREFIX + base64.urlsafe_b64encode(bytes(blob)).decode()
+
+        with pytest.raises(Exception):
+            manager.decrypt_secret(tampered)
+
+    def test_decrypt_secret_reads_legacy_fernet_formats(self, manager, fernet_key):
+        token = Fernet(fernet_key).encrypt(b"legacy value")
+
+        assert manager.decrypt_secret(token.decode()) == "legacy value"
+        assert manager.decrypt_secret(base64.urlsafe_b64encode(token).decode()) == "legacy value"
+
+    def test_reencrypt_secret_migrates_legacy_values(self, manager, fernet_key):
+        legacy = base64.urlsafe_b64encode(Fernet(fernet_key).encrypt(b"rotate me")).decode()
+        migrated = manager.reencrypt_secret(legacy)
+
+        assert migrated.startswith(AESGCM_PREFIX)
+        assert manager.decrypt_secret(migrated) == "rotate me"
+        assert manager.reencrypt_secret(migrated) == migrated
+
+    def test_encrypt_secrets_batch_round_trips(self, manager):
+        values = ["a", "b", "c"]
+        encrypted = manager.encrypt_secrets(values)
+
+        assert len(set(encrypted)) == 3
+        assert manager.decrypt_secrets(encrypted) == values
+
+
+@pytest.mark.unit
+class TestPasswordHashing:
+    """Test scrypt hashes with the "scrypt$" prefix and legacy PBKDF2 hashes."""
+
+    def test_hash_password_scrypt_verifies_with_prefix(self, manager):
+        hashed = manager.hash_password_scrypt("correct horse")
+
+        assert hashed["hash"].startswith(SCRYPT_HASH_PREFIX)
+        assert manager.verify_password("correct horse", hashed["hash"], hashed["salt"]) is True
+        assert manager.verify_password("wrong horse", hashed["hash"], hashed["salt"]) is False
+
+    def test_hash_password_legacy_pbkdf2_still_verifies(self, manager):
+        hashed = manager.hash_password("correct horse")
+
+        assert not hashed["hash"].startswith(SCRYPT_HASH_PREFIX)
+        assert manager.verify_password("correct horse", hashed["hash"], hashed["salt"]) is True
+        assert manager.verify_password("wrong horse", hashed["hash"], hashed["salt"]) is False
+
+    def test_verify_password_does_not_mix_algorithms(self, manager):
+        salt = b"0" * 32
+        pbkdf2_hash = manager.hash_password("secret", salt)["hash"]
+        scrypt_hash = manager.hash_password_scrypt("secret", salt)["hash"]
+        salt_b64 = base64.urlsafe_b64encode(salt).decode()
+
+        assert manager.verify_password("secret", SCRYPT_HASH_PREFIX + pbkdf2_hash, salt_b64) is False
+        assert manager.verify_password("secret", scrypt_hash[len(SCRYPT_HASH_PREFIX):], salt_b64) is False
+
+    def test_verify_password_bad_salt_returns_false(self, manager):
+        assert manager.verify_password("secret", "hash", "not base64!") is False
+
+
+@pytest.mark.unit
+class TestTokenRandomness:
+    """Test the pooled token randomness."""
+
+    def test_random_bytes_zeroes_handed_out_slices(self, manager):
+        first = manager._random_bytes(32)
+        second = manager._random_bytes(16)
+
+        assert len(first) == 32 and len(second) == 16
+        assert manager._rand_pool[:48] == bytes(48)
+        assert manager._rand_pool[48:] != bytes(len(manager._rand_pool) - 48)
+
+    def test_random_bytes_refills_exhausted_pool(self, manager):
+        tokens = {manager.generate_secure_token() for _ in range(RANDOM_POOL_SIZE // 32 + 4)}
+
+        assert len(tokens) == RANDOM_POOL_SIZE // 32 + 4
+        assert len(manager._rand_pool) == RANDOM_POOL_SIZE
@@ -0,0 +1,61 @@
+"""
+Unit tests for the vector database embedding migration
+"""
+
+import math
+
+import chromadb
+import pytest
+from chromadb.config import Settings
+
+from app.core.vector_db import VectorDatabase
+
+
+@pytest.fixture
+def chroma_client():
+    """In-memory Chroma client, emptied after each test."""
+    client = chromadb.EphemeralClient(Settings(anonymized_telemetry=False, allow_reset=True))
+    yield client
+    client.reset()
+
+
+@pytest.mark.unit
+class TestStoredEmbeddingNormalization:
+    """Test the one-time rescaling of stored embeddings to unit length."""
+
+    @pytest.mark.asyncio
+    async def test_normalize_stored_embeddings_rescales_and_marks(self, chroma_client):
+        collection = chroma_client.create_collection("legacy-docs", metadata={"description": "old"})
+        collection.add(ids=["a", "b"], embeddings=[[3.0, 4.0], [0.0, 2.0]], documents=["a", "b"])
+        vector_db = VectorDatabase()
+        vector_db.ADD_BATCH_SIZE = 1
+
+        await vector_db._normalize_stored_embeddings(collection)
+
+        stored = collection.get(ids=["a", "b"], include=["embeddings"])
+        for embedding in stored["embeddings"]:
+            assert math.hypot(*embedding) == pytest.approx(1.0)
+        assert stored["embeddings"][0] == pytest.approx([0.6, 0.8])
+        metadata = chroma_client.get_collection("legacy-docs").metadata
+        assert metadata == {"description": "old", "embedding_norm": "l2"}
+
+    @pytest.mark.asyncio
+    async def test_normalize_stored_embeddings_skips_marked_collections(self, chroma_client):
+        collection = chroma_client.create_collection(
+            "current-docs", metadata={"description": "new", "embedding_norm": "l2"}
+        )
+        collection.add(ids=["a"], embeddings=[[3.0, 4.0]], documents=["a"])
+
+        await VectorDatabase()._normalize_stored_embeddings(collection)
+
+        assert collection.get(ids=["a"], include=["embeddings"])["embeddings"][0] == pytest.approx([3.0, 4.0])
+
+    @pytest.mark.asyncio
+    async def test_create_collections_marks_new_collections(self, chroma_client):
+        vector_db = VectorDatabase()
+        vector_db.client = chroma_client
+        vector_db.collection_configs = {"fresh-docs": {"description": "fresh", "metadata_fields": []}}
+
+        await vector_db._create_collections()
+
+        assert vector_db.collections["fresh-docs"].metadata["embedding_norm"] == "l2"